@@ -0,0 +1,397 @@
+"""
+    JSON API: /api/v1
+    Same session login as the pages; POST/PATCH/DELETE need the CSRF token in the "X-CSRFToken" header.
+    Mutations answer with the changed rows only, so a client never has to reload a whole list.
+"""
+import io
+from datetime import datetime
+from itertools import chain
+from flask import Blueprint, current_app, request, abort, jsonify, make_response, has_request_context, Response, stream_with_context
+from flask_login import login_required, current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+import shortuuid
+import search
+import transfer
+from transfer import ImportFormatError
+from main import (app_state, invalidate_sidebar, set_archive, delete_list, page_tasks, adjust_counters,
+                  next_position, move_task, export_records, import_records)
+from models import db, DATE_FORMAT, List, Task
+
+bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+
+def api_abort(status, message):
+    """Abort the request with a JSON error body"""
+    abort(make_response(jsonify(error=message), status))
+
+def api_list(url_key):
+    """Return a list of the current user, or abort with 404"""
+    p_list = db.session.query(List).filter(List.url_key == url_key, List.user_id == current_user.id).first()
+    if not p_list:
+        api_abort(404, f"List {url_key} not found")
+    return p_list
+
+def api_task(id):
+    """Return a task in one of the current user's lists, or abort with 404"""
+    task = db.session.query(Task).join(List, Task.list_id == List.id).filter(
+        Task.id == id, List.user_id == current_user.id
+    ).first()
+    if not task:
+        api_abort(404, f"Task {id} not found")
+    return task
+
+def api_payload():
+    """JSON body of the request, or abort with 400"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        api_abort(400, "A JSON object is expected")
+    return payload
+
+def api_ids(payload):
+    """The "ids" member of a batch request, as a list of int"""
+    ids = payload.get("ids")
+    if not isinstance(ids, list) or not all(isinstance(id, int) for id in ids):
+        api_abort(400, '"ids" must be a list of task ids')
+    return ids
+
+def apply_task_fields(task, fields):
+    """
+        Set the editable fields of a task from a JSON dict and keep the list counters in step.
+        Unknown fields are rejected, due_date is parsed with DATE_FORMAT (null clears it).
+        An existing task is changed by one UPDATE ... WHERE version=, which moves its version on by one
+        and holds the row until commit. With "version", a task changed since that version is refused with 409
+        (optimistic locking); without it, the row is read again under lock when it changed since it was loaded.
+        Fields already at their value are left out, so a retried request changes nothing.
+    """
+    unknown = set(fields) - {"id", "name", "due_date", "status", "favorit", "version"}
+    if unknown:
+        api_abort(400, f"Unknown fields: {', '.join(sorted(unknown))}")
+    values = {}
+    if "name" in fields:
+        if not fields["name"]:
+            api_abort(400, "Task name can't be empty")
+        values["name"] = fields["name"]
+    if "due_date" in fields:
+        try:
+            values["due_date"] = datetime.strptime(fields["due_date"], DATE_FORMAT) if fields["due_date"] else None
+        except (TypeError, ValueError):
+            api_abort(400, f'"due_date" must be formatted as {DATE_FORMAT}')
+    for field in ("status", "favorit"):
+        if field in fields:
+            values[field] = bool(fields[field])
+    if task.id is None:
+        for field, value in values.items():
+            setattr(task, field, value)
+        return
+    for _ in range(2):
+        changes = {field: value for field, value in values.items() if getattr(task, field) != value}
+        if not changes:
+            return
+        version = fields.get("version", task.version)
+        if db.session.execute(
+            db.update(Task).where(Task.id == task.id, Task.version == version)
+            .values({**changes, "version": Task.version + 1}).execution_options(synchronize_session=False)
+        ).rowcount:
+            break
+        if "version" in fields:
+            api_abort(409, f"Task {task.id} has changed since version {version}")
+        db.session.refresh(task, with_for_update=True)
+    else:
+        api_abort(409, f"Task {task.id} is being changed, please retry")
+    if "status" in changes:
+        adjust_counters(task.list_id, done=1 if changes["status"] else -1)
+    for field, value in changes.items():
+        set_committed_value(task, field, value)
+    set_committed_value(task, "version", version + 1)
+
+@bp.route("/lists", methods=["GET"])
+@login_required
+def api_get_lists():
+    """All lists of the current user, archived ones included"""
+    lists = db.session.query(List).filter(List.user_id == current_user.id).order_by(List.id).all()
+    return jsonify(lists=[p_list.to_dict() for p_list in lists])
+
+@bp.route("/lists", methods=["POST"])
+@login_required
+def api_create_list():
+    """Create a list named by the "name" member"""
+    name = api_payload().get("name")
+    if not name:
+        api_abort(400, "List name can't be empty")
+    n_list = List(name=name, url_key=shortuuid.ShortUUID().random(length=10), created_date=datetime.today(),
+                  task_cnt=0, done_cnt=0, archive=False, user_id=current_user.id)
+    db.session.add(n_list)
+    invalidate_sidebar(current_user.id)
+    db.session.commit()
+    return jsonify(list=n_list.to_dict()), 201
+
+@bp.route("/lists/<url_key>", methods=["GET"])
+@login_required
+def api_get_list(url_key):
+    """A list and the first page of its tasks, see api_get_tasks()"""
+    p_list = api_list(url_key)
+    tasks, next_cursor = page_tasks(p_list.id)
+    return jsonify(list=p_list.to_dict(), tasks=[task.to_dict() for task in tasks], next=next_cursor)
+
+@bp.route("/lists/<url_key>", methods=["PATCH"])
+@login_required
+def api_update_list(url_key):
+    """Rename and/or (un)archive a list"""
+    p_list = api_list(url_key)
+    payload = api_payload()
+    if "name" in payload:
+        if not payload["name"]:
+            api_abort(400, "List name can't be empty")
+        p_list.name = payload["name"]
+    if "archive" in payload:
+        set_archive(p_list, bool(payload["archive"]))
+    invalidate_sidebar(current_user.id)
+    db.session.commit()
+    return jsonify(list=p_list.to_dict())
+
+@bp.route("/lists/<url_key>", methods=["DELETE"])
+@login_required
+def api_delete_list(url_key):
+    """Delete a list along with its tasks"""
+    p_list = api_list(url_key)
+    delete_list(p_list)
+    invalidate_sidebar(current_user.id)
+    db.session.commit()
+    return jsonify(deleted=url_key)
+
+@bp.route("/lists/<url_key>/tasks", methods=["GET"])
+@login_required
+def api_get_tasks(url_key):
+    """One page of the tasks of a list; pass the returned "next" cursor as ?after= to get the following page"""
+    p_list = api_list(url_key)
+    tasks, next_cursor = page_tasks(p_list.id, request.args.get("after"))
+    return jsonify(tasks=[task.to_dict() for task in tasks], next=next_cursor)
+
+@bp.route("/lists/<url_key>/tasks", methods=["POST"])
+@login_required
+def api_create_task(url_key):
+    """Create a task in a list from its JSON fields"""
+    p_list = api_list(url_key)
+    payload = api_payload()
+    if not payload.get("name"):
+        api_abort(400, "Task name can't be empty")
+    n_task = Task(list_id=p_list.id, status=False, favorit=False, position=next_position(p_list.id))
+    apply_task_fields(n_task, payload)
+    db.session.add(n_task)
+    adjust_counters(p_list.id, tasks=1, done=1 if n_task.status else 0)
+    db.session.commit()
+    return jsonify(task=n_task.to_dict()), 201
+
+@bp.route("/lists/<url_key>/tasks", methods=["PATCH"])
+@login_required
+def api_update_tasks(url_key):
+    """
+        Batch update: {"tasks": [{"id": 1, "favorit": true}, {"id": 2, "due_date": null}, ...]}
+        All rows are updated in one transaction; the updated rows are returned.
+    """
+    p_list = api_list(url_key)
+    changes = api_payload().get("tasks")
+    if not isinstance(changes, list) or not all(isinstance(change, dict) and isinstance(change.get("id"), int) for change in changes):
+        api_abort(400, '"tasks" must be a list of objects with an "id"')
+    tasks = {task.id: task for task in db.session.query(Task).filter(
+        Task.list_id == p_list.id, Task.id.in_([change["id"] for change in changes])
+    )}
+    missing = [change["id"] for change in changes if change["id"] not in tasks]
+    if missing:
+        api_abort(404, f"Tasks not found in list {url_key}: {missing}")
+    for change in changes:
+        apply_task_fields(tasks[change["id"]], change)
+    db.session.commit()
+    return jsonify(tasks=[tasks[change["id"]].to_dict() for change in changes])
+
+@bp.route("/lists/<url_key>/tasks/status", methods=["POST"])
+@login_required
+def api_set_status(url_key):
+    """
+        Batch status change: {"ids": [...], "status": true|false} sets the status ("status" is required,
+        so that a retried request changes nothing). Done with a single conditional UPDATE (WHERE status != <status>)
+        returning the ids it changed, so concurrent requests count each change once; only those tasks are returned.
+        Without UPDATE ... RETURNING (MySQL), the rows to change are read under lock first.
+    """
+    p_list = api_list(url_key)
+    payload = api_payload()
+    ids = api_ids(payload)
+    if "status" not in payload:
+        api_abort(400, '"status" is required')
+    status = bool(payload["status"])
+    to_change = (Task.list_id == p_list.id, Task.id.in_(ids), Task.status != status)
+    query = (
+        db.update(Task).where(*to_change).values(status=status, version=Task.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.get_bind().dialect.update_returning:
+        changed = db.session.scalars(query.returning(Task.id)).all()
+    else:
+        changed = db.session.scalars(db.select(Task.id).where(*to_change).with_for_update()).all()
+        db.session.execute(query)
+    if changed:
+        adjust_counters(p_list.id, done=len(changed) if status else -len(changed))
+    db.session.commit()
+    tasks = db.session.query(Task).filter(Task.id.in_(changed)).order_by(Task.id).all()
+    return jsonify(tasks=[task.to_dict() for task in tasks])
+
+@bp.route("/lists/<url_key>/tasks/delete", methods=["POST"])
+@login_required
+def api_delete_tasks(url_key):
+    """Batch delete: {"ids": [...]}; return the ids actually deleted"""
+    p_list = api_list(url_key)
+    ids = api_ids(api_payload())
+    rows = db.session.query(Task.id, Task.status).filter(Task.list_id == p_list.id, Task.id.in_(ids)).order_by(Task.id).all()
+    if rows:
+        db.session.execute(
+            db.delete(Task)
+            .where(Task.id.in_([row.id for row in rows]))
+            .execution_options(synchronize_session=False)
+        )
+        adjust_counters(p_list.id, tasks=-len(rows), done=-sum(1 for row in rows if row.status))
+    db.session.commit()
+    return jsonify(deleted=[row.id for row in rows])
+
+# Search indexes of the "memory" backend, per user
+search_indexes = app_state("search_indexes")
+
+def search_backend():
+    """SEARCH_BACKEND, or the backend found in the database on the first search (see `flask init-db`)"""
+    state = current_app.extensions["todo"]
+    if "search_backend" not in state:
+        state["search_backend"] = current_app.config["SEARCH_BACKEND"] or search.detect(db.session.connection())
+    return state["search_backend"]
+
+@event.listens_for(Session, "after_flush")
+def names_flushed(session, flush_context):
+    """A task or list of the current user was added, changed or deleted: its search index is stale"""
+    if has_request_context() and current_user.is_authenticated and any(
+        isinstance(obj, (Task, List)) for obj in chain(session.new, session.dirty, session.deleted)
+    ):
+        session.info.setdefault("stale_search", set()).add(current_user.id)
+
+@event.listens_for(Session, "do_orm_execute")
+def names_bulk_changed(orm_execute_state):
+    """Same for bulk INSERT / UPDATE / DELETE statements"""
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and has_request_context() and current_user.is_authenticated:
+        orm_execute_state.session.info.setdefault("stale_search", set()).add(current_user.id)
+
+@event.listens_for(Session, "after_commit")
+def drop_search_indexes(session):
+    for user_id in session.info.pop("stale_search", ()):
+        search_indexes.delete(user_id)
+
+@event.listens_for(Session, "after_soft_rollback")
+def keep_search_indexes(session, previous_transaction):
+    session.info.pop("stale_search", None)
+
+@bp.route("/search", methods=["GET"])
+@login_required
+def api_search():
+    """
+        Ranked search over the names of the current user's tasks (?type=tasks, default) or lists (?type=lists).
+        ?q=<words>&page=<n>: every word must match, the last one also as a prefix.
+        Served by the full-text index of the database (see search.py), so latency doesn't grow with the tables.
+    """
+    terms = search.tokenize(request.args.get("q", ""))
+    kind = request.args.get("type", "tasks")
+    page = request.args.get("page", 1, type=int)
+    if kind not in search.TABLES:
+        api_abort(400, f'"type" must be one of: {", ".join(search.TABLES)}')
+    if page < 1:
+        api_abort(400, '"page" must be 1 or more')
+    if not terms:
+        return jsonify(results=[], page=page, next=None)
+    page_size = current_app.config["SEARCH_PAGE_SIZE"]
+    limit, offset = page_size + 1, (page - 1) * page_size
+    backend = search_backend()
+    if backend == "memory":
+        index = search_indexes.get(current_user.id)
+        if index is None:
+            index = search.build_index(db.session.connection(), current_user.id)
+            search_indexes.set(current_user.id, index)
+        results = index.search(terms, kind, limit, offset)
+    else:
+        results = search.search_sql(db.session.connection(), backend, current_user.id, terms, kind, limit, offset)
+    for row in results:
+        for flag in ("status", "archive"):
+            if flag in row:
+                row[flag] = bool(row[flag])
+    return jsonify(results=results[:page_size], page=page, next=page + 1 if len(results) > page_size else None)
+
+@bp.route("/tasks/<int:id>", methods=["GET"])
+@login_required
+def api_get_task(id):
+    return jsonify(task=api_task(id).to_dict())
+
+@bp.route("/tasks/<int:id>", methods=["PATCH"])
+@login_required
+def api_update_task(id):
+    """Update the fields of one task"""
+    task = api_task(id)
+    apply_task_fields(task, api_payload())
+    db.session.commit()
+    return jsonify(task=task.to_dict())
+
+@bp.route("/tasks/<int:id>", methods=["DELETE"])
+@login_required
+def api_delete_task(id):
+    task = api_task(id)
+    db.session.delete(task)
+    adjust_counters(task.list_id, tasks=-1, done=-1 if task.status else 0)
+    db.session.commit()
+    return jsonify(deleted=id)
+
+@bp.route("/tasks/<int:id>/move", methods=["POST"])
+@login_required
+def api_move_task(id):
+    """
+        Drag and drop: {"after": <task id>} puts the task right after another task of its list,
+        {"after": null} first in the list. Only the moved task's position changes (see move_task()).
+    """
+    task = api_task(id)
+    payload = api_payload()
+    if "after" not in payload:
+        api_abort(400, '"after" must be a task id or null')
+    after = payload["after"]
+    if after is not None:
+        if not isinstance(after, int) or after == id:
+            api_abort(400, '"after" must be the id of another task or null')
+        if not db.session.query(Task.id).filter(Task.id == after, Task.list_id == task.list_id).first():
+            api_abort(404, f"Task {after} not found in the list of task {id}")
+    move_task(task, after)
+    db.session.commit()
+    return jsonify(task=task.to_dict())
+
+def transfer_format(formats):
+    """The "format" argument of an export / import request, "json" by default"""
+    fmt = request.args.get("format", "json")
+    if fmt not in formats:
+        api_abort(400, f'"format" must be one of: {", ".join(sorted(formats))}')
+    return fmt
+
+@bp.route("/export", methods=["GET"])
+@login_required
+def api_export():
+    """All lists and tasks of the current user, streamed as JSON Lines or CSV (?format=json|csv)"""
+    fmt = transfer_format(transfer.WRITERS)
+    chunks = transfer.WRITERS[fmt](export_records(current_user.id))
+    return Response(stream_with_context(chunks), mimetype=transfer.MIMETYPES[fmt], headers={
+        "Content-Disposition": f"attachment; filename=todo-export.{transfer.EXTENSIONS[fmt]}",
+    })
+
+@bp.route("/import", methods=["POST"])
+@login_required
+def api_import():
+    """Add the lists and tasks of the request body (an export, ?format=json|csv) to the current user"""
+    fmt = transfer_format(transfer.READERS)
+    # Read the body line by line as it arrives, newline="" as the csv module expects
+    lines = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    try:
+        lists, tasks = import_records(current_user.id, transfer.READERS[fmt](lines))
+    except (ImportFormatError, UnicodeDecodeError) as error:
+        api_abort(400, str(error))
+    return jsonify(lists=lists, tasks=tasks), 201
@@ -0,0 +1,90 @@
+"""
+    Sign-up, login and logout pages
+"""
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
+from flask_login import login_user, login_required, current_user, logout_user
+from forms import RegisterForm, LoginForm
+from hashing import HashingPoolBusy
+from main import password_pool
+from models import db, User
+
+bp = Blueprint("auth", __name__)
+
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    """
+        User Registration
+        - Flash error messages when there's a existing account
+        - Login user after the registration
+    """
+    form = RegisterForm()
+    if form.validate_on_submit():
+        email = request.form.get('email')
+        with current_app.app_context():
+            if db.session.query(User).filter(User.email == request.form.get('email')).first():
+                flash(f"An account is alredy signed up with \"{email}\"\nplease try other email address or move to login page instead.")
+            else:
+                try:
+                    hash_and_salt_pw = password_pool.hash(request.form.get("password"))
+                except HashingPoolBusy:
+                    flash("❗️ Too many sign-ups at the moment, please try again in a few seconds.", "error")
+                    return render_template('register.html', form=form), 503
+                new_user = User(
+                    email = request.form.get('email'),
+                    password = hash_and_salt_pw,
+                    name = request.form.get('name')
+                )
+                db.session.add(new_user)
+                db.session.commit()
+                login_user(new_user)  
+                flash("✓ Signed in successfully", "success")      
+                return redirect(url_for('lists.mylists'))
+    return render_template('register.html', form=form)
+
+@bp.route('/login', methods=["GET", "POST"])
+def login():
+    """
+        User Log in to the system
+        - Flash error message when the email address not found, or password is wrong
+        - Redirect to 'lists.html' page after login
+    """
+    form = LoginForm()
+    with current_app.app_context():
+        if form.validate_on_submit():
+            email = request.form.get('email')
+            password = request.form.get('password')
+            user = User.query.filter_by(email=email).first()
+            if not user:
+                flash("Email not found, please try again.")
+                return redirect(url_for('auth.login'))
+            try:
+                password_ok = password_pool.check(user.password, password)
+            except HashingPoolBusy:
+                flash("❗️ Too many sign-ins at the moment, please try again in a few seconds.", "error")
+                return render_template("login.html", form=form), 503
+            if not password_ok:
+                flash("❗️ Password incorrect, please try again.", "error")
+                return redirect(url_for('auth.login'))
+            else:
+                if password_pool.needs_rehash(user.password):
+                    # Hash parameters changed in config: upgrade the stored hash while we know the password,
+                    # or leave it for the next login when the pool is busy
+                    try:
+                        user.password = password_pool.hash(password)
+                        db.session.commit()
+                    except HashingPoolBusy:
+                        pass
+                login_user(user)
+                flash("✓ Signed in successfully", "success")
+                return redirect(url_for('lists.mylists'))
+    return render_template("login.html", form=form)
+
+
+@bp.route('/logout', methods=['GET'])
+@login_required
+def logout():
+    """Log out and back to the home page"""
+    if current_user.is_authenticated:
+        logout_user()
+    return redirect(url_for('lists.home'))
@@ -0,0 +1,310 @@
+"""
+    Benchmarks against a local SQLite database (or BENCH_DATABASE_URI).
+    Usage:
+        python benchmark.py lists [sizes...]    # copy / delete a list of N tasks (default: 10 100 1000 10000)
+        python benchmark.py login [threads...]  # login throughput with N concurrent clients (default: 1 4 16)
+        python benchmark.py transfer [sizes...] # export / import an account of N tasks (default: 1000 10000 100000)
+        python benchmark.py flows [sizes...]    # the main user flows on lists of N tasks (default: 10 100 1000)
+            [--lists N] [--repeat N] [--json FILE] [--baseline FILE] [--tolerance RATIO]
+
+    lists: for each list size, a list with N tasks is seeded, then copied and deleted through the routes.
+           Time and number of SQL statements are reported for each operation.
+    login: each client thread logs in LOGINS_PER_CLIENT times; logins/s, p50/p99 latency
+           and the number of logins turned away by the hashing pool (503) are reported.
+    transfer: for each account size, N tasks spread over lists of TASKS_PER_LIST are seeded, then exported
+           and imported back as JSON Lines through /api/v1. Rows/s and peak Python memory
+           (tracemalloc) are reported; the peak should stay flat as the size grows.
+           Rows/s are measured under tracemalloc, which slows Python down: compare them between runs only.
+    flows: for each list size, a user with --lists lists of N tasks is seeded, then each flow
+           (register, login, mylists, new_task GET / POST, complete, move_task, copy_list, del_list) is requested
+           --repeat times. Latency p50/p95/p99, SQL statements per request and peak Python memory of one
+           more request (tracemalloc, measured apart from the timed ones) are reported.
+           --json saves the results; --baseline compares them with a saved run and exits with 1 when a flow
+           got slower by more than --tolerance (p50) or sends more statements, so runs can gate a change.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import config
+
+# A file database, so that concurrent clients get their own connections
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="todo-bench-"), "bench.db")
+config.conf.SQLALCHEMY_DATABASE_URI = os.getenv("BENCH_DATABASE_URI", f"sqlite:///{DB_FILE}")
+config.conf.WTF_CSRF_ENABLED = False
+
+from sqlalchemy import event
+from main import create_app, init_db, POSITION_GAP
+from models import db, List, Task
+
+app = create_app()
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+DEFAULT_THREADS = [1, 4, 16]
+LOGINS_PER_CLIENT = 10
+DEFAULT_TRANSFER_SIZES = [1000, 10000, 100000]
+TASKS_PER_LIST = 100
+DEFAULT_FLOW_SIZES = [10, 100, 1000]
+
+
+class StatementCounter:
+    """Count the SQL statements sent to the engine while active"""
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def seed_list(user_id, size, url_key=None):
+    """Insert a list with `size` tasks in bulk (counters in step with them), return its url_key"""
+    url_key = url_key or f"bench{size}"
+    tasks = [
+        {"name": f"task {i}", "status": i % 3 == 0, "favorit": i % 7 == 0, "position": (i + 1) * POSITION_GAP}
+        for i in range(size)
+    ]
+    n_list = List(name=f"Bench {size}", url_key=url_key, created_date=datetime.today(),
+                  task_cnt=size, done_cnt=sum(task["status"] for task in tasks), archive=False, user_id=user_id)
+    db.session.add(n_list)
+    db.session.flush()
+    db.session.execute(db.insert(Task), [dict(task, list_id=n_list.id) for task in tasks])
+    db.session.commit()
+    return url_key
+
+
+def measure(client, counter, url, data=None):
+    """Request `url` (POST `data` when given, as JSON to the API), return (seconds, statements)"""
+    with counter:
+        start = time.perf_counter()
+        if data is None:
+            response = client.get(url)
+        elif url.startswith("/api/"):
+            response = client.post(url, json=data)
+        else:
+            response = client.post(url, data=data)
+        elapsed = time.perf_counter() - start
+    assert response.status_code in (200, 302), f"{url} -> {response.status_code}"
+    return elapsed, counter.count
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_lists(sizes, args):
+    client = app.test_client()
+    client.post("/register", data={"email": "bench@example.com", "password": "benchmark", "name": "Bench"})
+    with app.app_context():
+        user_id = db.session.execute(db.text("SELECT id FROM users WHERE email = 'bench@example.com'")).scalar()
+        counter = StatementCounter(db.engine)
+        print(f"{'tasks':>8} | {'copy (ms)':>10} {'stmts':>6} | {'delete (ms)':>11} {'stmts':>6}")
+        for size in sizes:
+            url_key = seed_list(user_id, size)
+            copy_time, copy_stmts = measure(client, counter, f"/copy/{url_key}")
+            del_time, del_stmts = measure(client, counter, f"/del/{url_key}")
+            print(f"{size:>8} | {copy_time * 1000:>10.1f} {copy_stmts:>6} | {del_time * 1000:>11.1f} {del_stmts:>6}")
+
+
+def run_login(threads, args):
+    app.test_client().post("/register", data={"email": "login@example.com", "password": "benchmark", "name": "Login"})
+    print(f"{'clients':>8} | {'logins/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'busy':>5}")
+    for clients in threads:
+        latencies, busy = [], []
+
+        def client_loop():
+            client = app.test_client()
+            for _ in range(LOGINS_PER_CLIENT):
+                start = time.perf_counter()
+                response = client.post("/login", data={"email": "login@example.com", "password": "benchmark"})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code == 503:
+                    busy.append(1)
+                client.get("/logout")
+
+        workers = [threading.Thread(target=client_loop) for _ in range(clients)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        print(f"{clients:>8} | {len(latencies) / elapsed:>9.1f} {percentile(latencies, 50) * 1000:>9.1f}"
+              f" {percentile(latencies, 99) * 1000:>9.1f} {len(busy):>5}")
+
+
+def traced(call):
+    """Run `call()`, return (result, seconds, peak traced memory in MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = call()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run_transfer(sizes, args):
+    print(f"{'tasks':>8} | {'export rows/s':>13} {'peak (MB)':>9} | {'import rows/s':>13} {'peak (MB)':>9}")
+    for size in sizes:
+        client = app.test_client()
+        email = f"transfer{size}@example.com"
+        client.post("/register", data={"email": email, "password": "benchmark", "name": "Transfer"})
+        with app.app_context():
+            user_id = db.session.execute(db.text("SELECT id FROM users WHERE email = :email"), {"email": email}).scalar()
+            for i in range(0, size, TASKS_PER_LIST):
+                seed_list(user_id, min(TASKS_PER_LIST, size - i), url_key=f"transfer{size}-{i}")
+        path = os.path.join(os.path.dirname(DB_FILE), f"export-{size}.jsonl")
+
+        def export():
+            # Written to a file chunk by chunk, as a client would, so only the app's memory is measured
+            with client.get("/api/v1/export?format=json", buffered=False) as response, open(path, "wb") as output:
+                for chunk in response.response:
+                    output.write(chunk)
+
+        def import_():
+            # input_stream: the body is read from the file by the app, not buffered by the test client
+            with open(path, "rb") as source:
+                response = client.post("/api/v1/import?format=json", input_stream=source,
+                                       content_length=os.path.getsize(path), content_type="application/x-ndjson")
+            assert response.status_code == 201, response.get_data(as_text=True)
+
+        rows = size + -(-size // TASKS_PER_LIST)
+        _, export_time, export_peak = traced(export)
+        _, import_time, import_peak = traced(import_)
+        print(f"{size:>8} | {rows / export_time:>13.0f} {export_peak:>9.1f} | {rows / import_time:>13.0f} {import_peak:>9.1f}")
+
+
+def flow_requests(client, user_id, size, lists, repeat):
+    """
+        {flow: [(url, form data or None)]}: `repeat` requests of each flow, for a user owning `lists` lists
+        of `size` tasks. The lists copied by copy_list are the ones deleted by del_list.
+    """
+    url_keys = [seed_list(user_id, size, url_key=f"flow{size}-{i}") for i in range(lists)]
+    task_ids = db.session.execute(
+        db.select(Task.id).join(List, Task.list_id == List.id).where(List.url_key == url_keys[0]).limit(repeat)
+    ).scalars().all()
+    emails = [f"flow{size}-{i}@example.com" for i in range(repeat)]
+    return {
+        "register": [("/register", {"email": email, "password": "benchmark", "name": "Flow"}) for email in emails],
+        "login": [("/login", {"email": emails[0], "password": "benchmark"})] * repeat,
+        "mylists": [("/my_lists", None)] * repeat,
+        "new_task GET": [(f"/task/{url_keys[i % lists]}", None) for i in range(repeat)],
+        "new_task POST": [(f"/task/{url_keys[0]}", {"name": f"flow task {i}"}) for i in range(repeat)],
+        "complete": [(f"/complete/{url_keys[0]}/{task_ids[i % len(task_ids)]}", {"status": "on"} if i % 2 else {})
+                     for i in range(repeat)],
+        # Dropped one after the other behind the first task: the gap halves each time until the list is rebalanced
+        "move_task": [(f"/api/v1/tasks/{task_ids[-1 - i % (len(task_ids) - 1)]}/move", {"after": task_ids[0]})
+                      for i in range(repeat)],
+        "copy_list": [(f"/copy/{url_keys[i % lists]}", None) for i in range(repeat)],
+    }
+
+
+def run_flow(client, counter, requests):
+    """Time `requests`, then trace the memory of one more; return the flow's results"""
+    latencies, statements = [], []
+    for url, data in requests:
+        elapsed, count = measure(client, counter, url, data)
+        latencies.append(elapsed)
+        statements.append(count)
+    url, data = requests[-1]
+    _, _, peak = traced(lambda: measure(client, counter, url, data))
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "statements": percentile(statements, 50),
+        "peak_kb": round(peak * 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of `results` against a `baseline` run, as messages"""
+    regressions = []
+    for size, flows in results.items():
+        for flow, result in flows.items():
+            before = baseline.get(size, {}).get(flow)
+            if not before:
+                continue
+            if result["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+                regressions.append(f"{flow} ({size} tasks): p50 {before['p50_ms']} -> {result['p50_ms']} ms")
+            if result["statements"] > before["statements"]:
+                regressions.append(f"{flow} ({size} tasks): {before['statements']} -> {result['statements']} statements")
+    return regressions
+
+
+def run_flows(sizes, args):
+    results = {}
+    for size in sizes:
+        client = app.test_client()
+        email = f"flows{size}@example.com"
+        client.post("/register", data={"email": email, "password": "benchmark", "name": "Flows"})
+        with app.app_context():
+            user_id = db.session.execute(db.text("SELECT id FROM users WHERE email = :email"), {"email": email}).scalar()
+            requests = flow_requests(client, user_id, size, args.lists, args.repeat)
+            counter = StatementCounter(db.engine)
+        flows = {}
+        # Requested outside of an app context: a request would reuse it, and flask-login's user in its `g`.
+        # Each flow on a client of its own: register / login switch the logged-in user
+        for flow, flow_requests_ in requests.items():
+            flow_client = client if flow not in ("register", "login") else app.test_client()
+            flows[flow] = run_flow(flow_client, counter, flow_requests_)
+        with app.app_context():
+            copies = db.session.execute(
+                db.select(List.url_key).where(List.user_id == user_id, List.name.like("% (copy)")).limit(args.repeat + 1)
+            ).scalars().all()
+        flows["del_list"] = run_flow(client, counter, [(f"/del/{url_key}", None) for url_key in copies])
+        results[str(size)] = flows
+        print(f"\n{size} tasks per list, {args.lists} lists, {args.repeat} requests per flow")
+        print(f"{'flow':>14} | {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'stmts':>6} {'peak (KB)':>10}")
+        for flow, result in flows.items():
+            print(f"{flow:>14} | {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}"
+                  f" {result['statements']:>6} {result['peak_kb']:>10.1f}")
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as source:
+            regressions = compare(results, json.load(source), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+SCENARIOS = {
+    "lists": (run_lists, DEFAULT_SIZES),
+    "login": (run_login, DEFAULT_THREADS),
+    "transfer": (run_transfer, DEFAULT_TRANSFER_SIZES),
+    "flows": (run_flows, DEFAULT_FLOW_SIZES),
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=SCENARIOS)
+    parser.add_argument("values", nargs="*", type=int)
+    parser.add_argument("--lists", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+    scenario, defaults = SCENARIOS[args.scenario]
+    with app.app_context():
+        init_db()
+    scenario(args.values or defaults, args)
@@ -0,0 +1,136 @@
+"""
+    Per-user fragment cache with version-stamp invalidation.
+
+    Every user has a version stamp; cached entries are keyed by it, so bumping the stamp
+    makes all entries of that user unreachable at once (they age out of the LRU by themselves).
+
+    TTLCache is a bounded in-process cache with expiring entries, used for the logged-in user principals.
+
+    The storage backend of FragmentCache is any object with get(key) / set(key, value) / delete(key)
+    (e.g. a cachelib cache to share the cache between workers); by default an in-process LRU.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe in-process LRU storage holding up to `maxsize` entries"""
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        return True
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TTLCache(LRUCache):
+    """
+        LRU storage whose entries expire `ttl` seconds after they were set.
+        Counts hits and misses of get().
+    """
+    def __init__(self, maxsize=1024, ttl=300):
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = super().get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        return super().set(key, (time.monotonic() + self.ttl, value))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self),
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class FragmentCache:
+    """
+        Cache of per-user data and rendered fragments.
+        - get_or_set(user_id, name, build): cached value of `name` for the user's current version,
+          `build()` is called on a miss
+        - invalidate(user_id): bump the user's version stamp
+        - stats(): hit / miss / invalidation counters
+    """
+    def __init__(self, backend=None, prefix="fragment"):
+        self.backend = backend if backend is not None else LRUCache()
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _version_key(self, user_id):
+        return f"{self.prefix}:version:{user_id}"
+
+    def version(self, user_id):
+        """
+            Current version stamp of a user. A lost stamp (evicted, backend restarted) is replaced
+            by a fresh random one, so entries cached under the old stamp can never be served again.
+        """
+        version = self.backend.get(self._version_key(user_id))
+        if version is None:
+            version = uuid.uuid4().hex[:12]
+            self.backend.set(self._version_key(user_id), version)
+        return version
+
+    def invalidate(self, user_id):
+        self.backend.set(self._version_key(user_id), uuid.uuid4().hex[:12])
+        self.invalidations += 1
+
+    def get_or_set(self, user_id, name, build):
+        key = f"{self.prefix}:{user_id}:{self.version(user_id)}:{name}"
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = build()
+        self.backend.set(key, value)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,245 @@
+"""
+    CLI commands (flask --app main <command>): schema setup and migration, maintenance, export / import, reminders
+"""
+from time import sleep
+import click
+from flask import Blueprint, current_app
+from flask.cli import AppGroup
+from sqlalchemy import case, inspect, text
+import search
+import transfer
+from transfer import ImportFormatError
+from main import (init_db, freeze_tasks, task_order, after_cursor, rebalance_positions, POSITION_GAP,
+                  POSITION_MIN_GAP, named_like, export_records, import_records)
+from models import db, User, List, Task, ListArchive, NameSuffix
+
+# cli_group=None: the commands are added to `flask` itself, not under a "commands" group
+bp = Blueprint("commands", __name__, cli_group=None)
+
+
+@bp.cli.command("init-db")
+def init_db_command():
+    """Create the missing tables and the full-text search indexes of a new database"""
+    print(f"Search backend: {init_db()}")
+    print("Database initialized.")
+
+
+@bp.cli.command("upgrade-db")
+def upgrade_db():
+    """
+        Migrate a database created by the old string-typed schema in place:
+            - lists.created_date / tasks.due_date: VARCHAR -> DATETIME
+            - lists.task_cnt: VARCHAR -> INT, new lists.done_cnt counter
+            - new tasks.reminded_due column, the due-date reminders sent
+            - new tasks.position column, the manual order: filled in the order the tasks were shown before
+            - new tasks.version column, bumped by every change of a task (optimistic locking)
+            - users.password: VARCHAR(100) -> VARCHAR(255), room for stronger hash parameters
+            - tasks.status / tasks.favorit: NULL -> False
+            - add the composite indexes declared in __table_args__ and the full-text search indexes
+        SQLite keeps the stored "%Y-%m-%d %H:%M:%S" text as is, which the DateTime type reads back natively.
+    """
+    # New tables (name_suffixes, list_archives...) first: the steps below only alter existing ones
+    db.create_all()
+    dialect = db.engine.dialect.name
+    with db.engine.begin() as conn:
+        conn.execute(text("UPDATE tasks SET due_date = NULL WHERE due_date = ''"))
+        conn.execute(text("UPDATE tasks SET status = 0 WHERE status IS NULL"))
+        conn.execute(text("UPDATE tasks SET favorit = 0 WHERE favorit IS NULL"))
+        conn.execute(text("UPDATE lists SET archive = 0 WHERE archive IS NULL"))
+        if dialect == "mysql":
+            conn.execute(text("ALTER TABLE users MODIFY password VARCHAR(255)"))
+            conn.execute(text("ALTER TABLE lists MODIFY created_date DATETIME NOT NULL"))
+            conn.execute(text("ALTER TABLE lists MODIFY task_cnt INT NOT NULL DEFAULT 0"))
+            conn.execute(text("ALTER TABLE lists MODIFY archive BOOL NOT NULL DEFAULT 0"))
+            conn.execute(text("ALTER TABLE tasks MODIFY due_date DATETIME NULL"))
+            conn.execute(text("ALTER TABLE tasks MODIFY status BOOL NOT NULL DEFAULT 0"))
+            conn.execute(text("ALTER TABLE tasks MODIFY favorit BOOL NOT NULL DEFAULT 0"))
+        inspector = inspect(conn)
+        if "done_cnt" not in {column["name"] for column in inspector.get_columns("lists")}:
+            conn.execute(text("ALTER TABLE lists ADD COLUMN done_cnt INTEGER NOT NULL DEFAULT 0"))
+        task_columns = {column["name"] for column in inspector.get_columns("tasks")}
+        if "reminded_due" not in task_columns:
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN reminded_due DATETIME NULL"))
+        if "position" not in task_columns:
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN position BIGINT NOT NULL DEFAULT 0"))
+        if "version" not in task_columns:
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+        for table in (List.__table__, Task.__table__):
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    print(f"Index created: {index.name}")
+        print(f"Search backend: {search.setup(conn, current_app.config['SEARCH_BACKEND'])}")
+    if "position" not in task_columns:
+        print(f"Task positions set on {number_lists()} list(s).")
+    print(f"Counters repaired on {recount_lists()} list(s).")
+    print("Database upgraded.")
+
+
+def number_lists():
+    """
+        Give the tasks of every list their first positions, in the order the pages showed them
+        before the manual order: open before completed, starred first, earliest due date first.
+        Committed one list at a time.
+    """
+    shown_order = (Task.status.asc(), Task.favorit.desc(), case((Task.due_date == None, 1), else_=0).asc(),
+                   Task.due_date.asc(), Task.id.asc())
+    list_ids = db.session.execute(db.select(Task.list_id).distinct()).scalars().all()
+    for list_id in list_ids:
+        rebalance_positions(list_id, shown_order)
+        db.session.commit()
+    return len(list_ids)
+
+
+@bp.cli.command("reconcile-counters")
+def reconcile_counters():
+    """Recount task_cnt / done_cnt of every list and repair the ones that have drifted"""
+    print(f"Counters repaired on {recount_lists()} list(s).")
+
+
+def recount_lists():
+    """
+        Set task_cnt / done_cnt from the tasks table with one correlated UPDATE,
+        only touching the lists whose counters are wrong. Return the number of repaired lists.
+        Lists in cold storage are skipped: their tasks aren't in the tasks table.
+    """
+    task_total = db.select(db.func.count(Task.id)).where(Task.list_id == List.id).scalar_subquery()
+    done_total = db.select(db.func.count(Task.id)).where(Task.list_id == List.id, Task.status == True).scalar_subquery()
+    result = db.session.execute(
+        db.update(List)
+        .where(db.or_(List.task_cnt != task_total, List.done_cnt != done_total))
+        .where(~db.select(ListArchive.list_id).where(ListArchive.list_id == List.id).exists())
+        .values(task_cnt=task_total, done_cnt=done_total)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+@bp.cli.command("freeze-archived")
+def freeze_archived():
+    """
+        Move the tasks of the lists archived before ARCHIVE_COLD_STORAGE was turned on to cold storage,
+        committing one list at a time
+    """
+    list_ids = db.session.execute(
+        db.select(List.id).where(
+            List.archive == True,
+            ~db.select(ListArchive.list_id).where(ListArchive.list_id == List.id).exists(),
+        )
+    ).scalars().all()
+    for list_id in list_ids:
+        freeze_tasks(list_id)
+        db.session.commit()
+    print(f"{len(list_ids)} archived list(s) moved to cold storage.")
+
+
+@bp.cli.command("rebalance-positions")
+def rebalance_positions_command():
+    """
+        Renumber the lists whose tasks were moved so often that neighbours are closer than POSITION_MIN_GAP,
+        before a move runs out of room (run it now and then, e.g. from cron). Commits one list at a time.
+    """
+    previous = db.func.lag(Task.position).over(partition_by=Task.list_id, order_by=task_order())
+    gaps = db.select(Task.list_id, (Task.position - previous).label("gap")).subquery()
+    list_ids = db.session.execute(
+        db.select(gaps.c.list_id).where(gaps.c.gap < POSITION_MIN_GAP).distinct()
+    ).scalars().all()
+    for list_id in list_ids:
+        rebalance_positions(list_id)
+        db.session.commit()
+    print(f"{len(list_ids)} list(s) rebalanced.")
+
+
+@bp.cli.command("explain-queries")
+def explain_queries():
+    """
+        Print the query plan of the hot queries (mylists, new_list, new_task)
+        so we can check each one is served by an index lookup instead of a full scan.
+    """
+    dialect = db.engine.dialect.name
+    explain = "EXPLAIN QUERY PLAN" if dialect == "sqlite" else "EXPLAIN"
+    hot_queries = {
+        "mylists": db.select(List).where(List.user_id == 1, List.archive == False),
+        "archived": db.select(List).where(List.user_id == 1, List.archive == True, List.id < 100)
+            .order_by(List.id.desc()).limit(50),
+        "new_list (name suffix seed)": db.select(db.func.max(db.cast(db.func.substr(List.name, 13), db.Integer))).where(
+            List.user_id == 1, named_like(List.name, "To-do list"),
+        ),
+        "new_task": db.select(Task).where(Task.list_id == 1).order_by(*task_order()).limit(50),
+        "move_task (next neighbour)": db.select(Task.position).where(
+            Task.list_id == 1, Task.id != 2, after_cursor((POSITION_GAP, 3))
+        ).order_by(*task_order()).limit(1),
+        "new_task (append position)": db.select(db.func.max(Task.position)).where(Task.list_id == 1),
+        "new_task (name suffix seed)": db.select(db.func.max(db.cast(db.func.substr(Task.name, 5), db.Integer))).where(
+            Task.list_id == 1, named_like(Task.name, "foo"),
+        ),
+        "name suffix": db.select(
+            NameSuffix.used, db.select(Task.name).where(Task.list_id == 1, Task.name == "foo").exists()
+        ).where(NameSuffix.scope == "list:1", NameSuffix.name == "foo"),
+    }
+    with db.engine.connect() as conn:
+        for name, query in hot_queries.items():
+            sql = str(query.compile(conn, compile_kwargs={"literal_binds": True}))
+            print(f"== {name}\n{sql}")
+            for row in conn.execute(text(f"{explain} {sql}")):
+                print("   ", tuple(row))
+
+
+todo_cli = AppGroup("todo", help="Export / import the lists and tasks of a user.")
+bp.cli.add_command(todo_cli)
+
+def cli_user_id(email):
+    user_id = db.session.query(User.id).filter(User.email == email).scalar()
+    if user_id is None:
+        raise click.ClickException(f"No user with email {email}")
+    return user_id
+
+@todo_cli.command("export")
+@click.argument("email")
+@click.option("--format", "fmt", type=click.Choice(sorted(transfer.WRITERS)), default="json", show_default=True)
+@click.option("--output", "-o", type=click.File("w", encoding="utf-8"), default="-", help="Default: stdout")
+def export_command(email, fmt, output):
+    """Write all lists and tasks of the user EMAIL"""
+    for chunk in transfer.WRITERS[fmt](export_records(cli_user_id(email))):
+        output.write(chunk)
+
+@todo_cli.command("import")
+@click.argument("email")
+@click.argument("source", type=click.File("r", encoding="utf-8"), default="-")
+@click.option("--format", "fmt", type=click.Choice(sorted(transfer.READERS)), default="json", show_default=True)
+def import_command(email, source, fmt):
+    """Add the lists and tasks of SOURCE (an export file, default: stdin) to the user EMAIL"""
+    try:
+        lists, tasks = import_records(cli_user_id(email), transfer.READERS[fmt](source))
+    except (ImportFormatError, UnicodeDecodeError) as error:
+        raise click.ClickException(str(error))
+    print(f"Imported {lists} list(s), {tasks} task(s).")
+
+
+@bp.cli.command("send-reminders")
+@click.option("--every", type=int, default=0, help="Run again every N seconds (default: run once)")
+def send_reminders_command(every):
+    """Email the users whose tasks are due within REMINDER_WINDOW_HOURS"""
+    # Imported here: only this command needs smtplib / email
+    from mailer import SMTPPool
+    from reminders import send_reminders
+    if not current_app.config["MAIL_SERVER"] or not current_app.config["OWN_EMAIL"]:
+        raise click.ClickException("MAIL_SERVER and OWN_EMAIL must be set")
+    with SMTPPool(
+        current_app.config["MAIL_SERVER"], current_app.config["MAIL_PORT"],
+        use_tls=current_app.config["MAIL_USE_TLS"],
+        username=current_app.config["OWN_EMAIL"] if current_app.config["OWN_PW"] else None,
+        password=current_app.config["OWN_PW"],
+        size=current_app.config["MAIL_POOL_SIZE"],
+        retries=current_app.config["MAIL_RETRIES"],
+        backoff=current_app.config["MAIL_RETRY_BACKOFF"],
+        timeout=current_app.config["MAIL_TIMEOUT"],
+    ) as mailer:
+        while True:
+            sent, failed = send_reminders(mailer)
+            print(f"Reminders sent: {sent}, failed: {failed}.")
+            if not every:
+                break
+            sleep(every)
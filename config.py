@@ -4,6 +4,37 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def env_int(name, default):
+    """Integer setting from the environment, `default` when unset or empty"""
+    return int(os.getenv(name) or default)
+
+
+def engine_options(settings):
+    """
+        SQLALCHEMY_ENGINE_OPTIONS built from the DB_* settings, for the dialect of SQLALCHEMY_DATABASE_URI.
+        - pool sizing applies to pooled engines; an in-memory SQLite database lives on one static connection
+        - the connect timeout goes to the driver under its own name
+    """
+    uri = settings["SQLALCHEMY_DATABASE_URI"]
+    options = {
+        "pool_pre_ping": settings["DB_POOL_PRE_PING"],
+        "pool_recycle": settings["DB_POOL_RECYCLE"],
+    }
+    if uri.startswith("sqlite"):
+        options["connect_args"] = {"timeout": settings["DB_CONNECT_TIMEOUT"]}
+        if uri in ("sqlite://", "sqlite:///:memory:"):
+            return options
+    else:
+        options["connect_args"] = {"connect_timeout": settings["DB_CONNECT_TIMEOUT"]}
+    options.update(
+        pool_size=settings["DB_POOL_SIZE"],
+        max_overflow=settings["DB_MAX_OVERFLOW"],
+        pool_timeout=settings["DB_POOL_TIMEOUT"],
+    )
+    return options
+
+
 class Config:
     """Basic configues settings"""
     DEBUG = False
@@ -20,24 +51,100 @@ class Config:
     HOST: str = os.getenv('HOST')
     PORT: str = os.getenv('PORT')
     DATABASE: str = os.getenv('DATABASE')
-    SQLALCHEMY_DATABASE_URI = f"{DIALECT}+{DRIVER}://{USERNAME}:{PASSWORD}@{HOST}:{PORT}/{DATABASE}?charset=utf8"
+    # DATABASE_URL overrides the MySQL settings, e.g. "sqlite:///todo.db" for tests
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL') or f"{DIALECT}+{DRIVER}://{USERNAME}:{PASSWORD}@{HOST}:{PORT}/{DATABASE}?charset=utf8"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Connection pool, turned into SQLALCHEMY_ENGINE_OPTIONS by engine_options()
+    # - DB_POOL_SIZE / DB_MAX_OVERFLOW: connections kept open / opened on top of them under load
+    # - DB_POOL_TIMEOUT: seconds to wait for a free connection before failing
+    # - DB_POOL_RECYCLE: seconds before a connection is replaced, below MySQL's wait_timeout
+    # - DB_POOL_PRE_PING: test each connection on checkout, so a dropped one is replaced instead of failing the request
+    # - DB_CONNECT_TIMEOUT: seconds to wait for the database server when connecting
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 5)
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 10)
+    DB_POOL_TIMEOUT = env_int('DB_POOL_TIMEOUT', 30)
+    DB_POOL_RECYCLE = env_int('DB_POOL_RECYCLE', 280)
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ['true', 'on', '1']
+    DB_CONNECT_TIMEOUT = env_int('DB_CONNECT_TIMEOUT', 10)
+
+    # Logging: level of the app loggers; requests slower than SLOW_REQUEST_MS are logged on "todo.slow"
+    # along with their SLOW_QUERIES_LOGGED slowest SQL statements
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    SLOW_REQUEST_MS = env_int('SLOW_REQUEST_MS', 500)
+    SLOW_QUERIES_LOGGED = 3
+
+    # Number of tasks rendered per page on the task view (more are loaded on scroll)
+    TASK_PAGE_SIZE = 50
+
+    # Archived lists: page size of the archived-lists page; with ARCHIVE_COLD_STORAGE the tasks of a list
+    # are moved out of the tasks table (into list_archives, compressed) while it's archived
+    ARCHIVE_PAGE_SIZE = 50
+    ARCHIVE_COLD_STORAGE = os.getenv('ARCHIVE_COLD_STORAGE', 'false').lower() in ['true', 'on', '1']
+
+    # Full-text search: backend "mysql", "fts5" or "memory" (None: picked for the database in use)
+    SEARCH_BACKEND = os.getenv('SEARCH_BACKEND') or None
+    SEARCH_PAGE_SIZE = 20
+    # "memory" backend: per-user indexes kept by a worker, and how long before they're rebuilt
+    SEARCH_INDEX_CACHE_SIZE = 256
+    SEARCH_INDEX_TTL = 60  # seconds
+
+    # Export / import: rows fetched per round trip when exporting, rows inserted per transaction when importing
+    TRANSFER_BATCH_SIZE = env_int('TRANSFER_BATCH_SIZE', 1000)
+
+    # Per-user cache of the sidebar / list-page fragments.
+    # Backend: any object with get/set/delete (e.g. a cachelib cache shared by all workers),
+    # None for an in-process LRU of SIDEBAR_CACHE_SIZE entries.
+    SIDEBAR_CACHE_BACKEND = None
+    SIDEBAR_CACHE_SIZE = 4096
+
+    # Cache of the logged-in user loaded on each request (saves one query per request)
+    USER_CACHE_ENABLED = os.getenv('USER_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    USER_CACHE_SIZE = 10000
+    USER_CACHE_TTL = 300  # seconds
+
+    # Password hashing, in werkzeug's method format with the cost spelled out
+    # (e.g. "pbkdf2:sha256:600000" or "scrypt:32768:8:1").
+    # Hashes made with other parameters are rehashed on the next successful login.
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_SALT_LENGTH = 16
+    # Hashes computed at once / waiting for a worker, seconds to wait for a slot before answering 503
+    PASSWORD_HASH_WORKERS = 4
+    PASSWORD_HASH_QUEUE = 32
+    PASSWORD_HASH_TIMEOUT = 5
+
     # Configs for E-mail:
     MAIL_SERVER: str = os.getenv('MAIL_SERVER')
-    MAIL_PORT: int = os.getenv('MAIL_PORT')
+    MAIL_PORT: int = env_int('MAIL_PORT', 587)
     MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
     OWN_EMAIL: str = os.getenv('OWN_EMAIL')
     OWN_PW :str = os.getenv('OWN_PW')
+    # SMTP connections kept open, retries of a failed message (the backoff doubles each time), socket timeout
+    MAIL_POOL_SIZE = env_int('MAIL_POOL_SIZE', 4)
+    MAIL_RETRIES = 3
+    MAIL_RETRY_BACKOFF = 1.0  # seconds
+    MAIL_TIMEOUT = 30  # seconds
+
+    # Due-date reminders (flask send-reminders): undone tasks due within REMINDER_WINDOW_HOURS,
+    # mailed as one digest per user listing at most REMINDER_DIGEST_SIZE tasks, REMINDER_BATCH_SIZE users at a time
+    REMINDER_WINDOW_HOURS = env_int('REMINDER_WINDOW_HOURS', 24)
+    REMINDER_DIGEST_SIZE = 50
+    REMINDER_BATCH_SIZE = 100
 
 
 class DevelopmentConfig(Config):
     """Development Config settings"""
     DEBUG = True
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG')
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 2)
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 3)
 
 
 class ProductionConfig(Config):
     """Production Configs Settings"""
     DEBUG = False
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 20)
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 10)
+    DB_POOL_TIMEOUT = env_int('DB_POOL_TIMEOUT', 10)
 
-conf = DevelopmentConfig
\ No newline at end of file
+conf = ProductionConfig if os.getenv('APP_ENV') == 'production' else DevelopmentConfig
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""
+    Forms of the pages (the JSON API takes JSON bodies instead).
+"""
+from flask_wtf import FlaskForm
+from wtforms import StringField, BooleanField, SubmitField, PasswordField
+from wtforms.validators import DataRequired, Email, Length
+
+
+class RegisterForm(FlaskForm):
+    """
+        User to register an account to access Task Management Sysytem.
+        Infomation will be saved to the user table:
+            - email
+            - password
+            - name
+    """
+    email = StringField("Email", validators=[DataRequired()])
+    password = PasswordField("Password", validators=[DataRequired(), Length(min=8)])
+    name = StringField("Name", validators=[DataRequired()])
+    submit = SubmitField("SIGN ME UP!")
+
+class LoginForm(FlaskForm):
+    """
+        User to login to the Task Management Sysytem.
+    """
+    email = StringField(label='Email', validators=[DataRequired(), Email()])
+    password = PasswordField(label='Password', validators=[DataRequired(), Length(min=8)])
+    submit = SubmitField(label="Log In")
+
+class ListForm(FlaskForm):
+    """
+        Add a new list under a existing board.
+    """
+    name = StringField(label='List name', validators=[DataRequired()])
+    favorit = BooleanField(label="☆")
+    submit = SubmitField(label='Submit')
+
+class TaskForm(FlaskForm):
+    """
+        Add a new task to a existing list
+    """
+    name = StringField(label='Title:', validators=[DataRequired()])
+    due_date = StringField(label='Due Date:')
+    status = BooleanField(label="Status:")
+    favorit = BooleanField(label="☆")
+    submit = SubmitField(label='Submit')
@@ -0,0 +1,36 @@
+"""
+    gunicorn settings of the production server (gunicorn -c gunicorn.conf.py wsgi:app).
+
+    Every request does blocking database I/O, so each worker process serves requests on a thread pool
+    ("gthread"): a thread waiting on MySQL lets the others run. Threads beyond the connection pool
+    (DB_POOL_SIZE + DB_MAX_OVERFLOW) would only queue for a connection, so that's the default thread count.
+    "gevent" needs a driver gevent can patch, i.e. a pure-Python one (DATABASE_URL=mysql+pymysql://...):
+    mysqlclient blocks the whole worker while waiting on the server.
+
+    Environment: BIND, WEB_CONCURRENCY (worker processes), GUNICORN_THREADS, GUNICORN_WORKER_CLASS,
+    GUNICORN_TIMEOUT, GUNICORN_MAX_REQUESTS.
+"""
+import multiprocessing
+import os
+
+# Module-level names are read as gunicorn settings (and "config" is one): import only these
+from config import conf, env_int
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = env_int("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = env_int("GUNICORN_THREADS", conf.DB_POOL_SIZE + conf.DB_MAX_OVERFLOW)
+if worker_class == "gevent":
+    worker_connections = threads
+timeout = env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = 30
+keepalive = 5
+# Restart workers now and then, so a slow leak can't grow for ever
+max_requests = env_int("GUNICORN_MAX_REQUESTS", 10000)
+max_requests_jitter = max_requests // 10
+
+# Build the app once in the master, then fork the workers (create_app() opens no connection)
+preload_app = True
+accesslog = "-"
+loglevel = conf.LOG_LEVEL.lower()
+
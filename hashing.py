@@ -0,0 +1,58 @@
+"""
+    Password hashing on a bounded worker pool.
+
+    pbkdf2 / scrypt spend their time in OpenSSL with the GIL released, so a thread pool
+    runs them in parallel while the request threads only wait for the result.
+    The pool caps how many hashes run at once and how many may wait for a worker:
+    a burst of logins beyond that is turned away at once (HashingPoolBusy)
+    instead of stalling every other request of the worker.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingPoolBusy(Exception):
+    """Raised when the hashing pool and its queue are full"""
+
+
+class HashingPool:
+    """
+        - method / salt_length: parameters of new hashes, in werkzeug's format (e.g. "pbkdf2:sha256:600000")
+        - workers: number of hashes computed at once
+        - max_queue: number of hashes allowed to wait for a worker
+        - timeout: seconds to wait for a free slot before giving up
+    """
+    def __init__(self, method, salt_length=16, workers=4, max_queue=32, timeout=5):
+        self.method = method
+        self.salt_length = salt_length
+        self.timeout = timeout
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            self.rejected += 1
+            raise HashingPoolBusy("Too many password hashes in progress")
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password):
+        """Hash a password with the configured method and salt length"""
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def check(self, pwhash, password):
+        """Check a password against a hash made with any method werkzeug knows"""
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True when a hash was made with other parameters than the configured ones"""
+        method, _, rest = pwhash.partition("$")
+        salt = rest.partition("$")[0]
+        return method != self.method or len(salt) != self.salt_length
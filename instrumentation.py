@@ -0,0 +1,167 @@
+"""
+    Request instrumentation: latency, number of SQL statements and DB time per request.
+
+    - SQL statements are timed with SQLAlchemy engine events, and attributed to the running request
+    - totals per endpoint are exposed in Prometheus' text format by render()
+    - requests slower than SLOW_REQUEST_MS are logged as one JSON line on the "todo.slow" logger,
+      with their slowest statements
+"""
+import json
+import logging
+import threading
+import time
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+slow_logger = logging.getLogger("todo.slow")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Key of the per-request RequestStats in the WSGI environ.
+# Not flask.g: the routes push their own app contexts, each with a fresh g.
+ENVIRON_KEY = "todo.metrics"
+
+
+def before_execute(conn, cursor, statement, parameters, context, executemany):
+    """Note the start time on the execution context: it goes away with the statement, even one that fails"""
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def after_execute(conn, cursor, statement, parameters, context, executemany):
+    """Attribute a statement to the running request, whichever app serves it"""
+    start = getattr(context, "_metrics_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    stats = request.environ.get(ENVIRON_KEY) if has_request_context() else None
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_time += elapsed
+    stats.statements.append((elapsed, statement))
+
+
+class RequestStats:
+    """Measures of the running request"""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = []
+
+
+class EndpointStats:
+    """Running totals of one endpoint"""
+    def __init__(self):
+        self.requests = {}  # status code -> count
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+
+    def add(self, status, latency, queries, db_time):
+        self.requests[status] = self.requests.get(status, 0) + 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[i] += 1
+        self.latency += latency
+        self.queries += queries
+        self.db_time += db_time
+
+    @property
+    def count(self):
+        return sum(self.requests.values())
+
+
+class RequestMetrics:
+    """
+        Collect per-request metrics of a Flask app:
+            metrics = RequestMetrics(app)
+            metrics.add_gauge("todo_cache_hits", "Cache hits", lambda: {"cache=\"user\"": user_cache.hits})
+            metrics.render()  # Prometheus text
+        Settings: SLOW_REQUEST_MS (log threshold), SLOW_QUERIES_LOGGED (statements listed per slow request).
+    """
+    def __init__(self, app=None):
+        self.endpoints = {}
+        self.gauges = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.slow_request = app.config.get("SLOW_REQUEST_MS", 500) / 1000
+        self.slow_queries = app.config.get("SLOW_QUERIES_LOGGED", 3)
+        app.before_request(self._start_request)
+        app.after_request(self._end_request)
+        # Engine events are global: listen once however many apps are created (tests, CLI)
+        if not event.contains(Engine, "after_cursor_execute", after_execute):
+            event.listen(Engine, "before_cursor_execute", before_execute)
+            event.listen(Engine, "after_cursor_execute", after_execute)
+
+    def add_gauge(self, name, help, collect):
+        """Expose the values returned by `collect()` (a dict of label string -> number) under `name`"""
+        self.gauges.append((name, help, collect))
+
+    # ------------------------------------------------------------------
+    def _start_request(self):
+        request.environ[ENVIRON_KEY] = RequestStats()
+
+    def _end_request(self, response):
+        stats = request.environ.pop(ENVIRON_KEY, None)
+        if stats is None:
+            return response
+        latency = time.perf_counter() - stats.start
+        endpoint = request.endpoint or "unmatched"
+        with self._lock:
+            self.endpoints.setdefault(endpoint, EndpointStats()).add(
+                response.status_code, latency, stats.queries, stats.db_time
+            )
+        if latency >= self.slow_request and slow_logger.isEnabledFor(logging.WARNING):
+            slowest = sorted(stats.statements, key=lambda item: item[0], reverse=True)[:self.slow_queries]
+            slow_logger.warning(json.dumps({
+                "endpoint": endpoint,
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "latency_ms": round(latency * 1000, 1),
+                "queries": stats.queries,
+                "db_ms": round(stats.db_time * 1000, 1),
+                "slowest": [{"ms": round(elapsed * 1000, 1), "sql": " ".join(statement.split())}
+                            for elapsed, statement in slowest],
+            }))
+        return response
+
+    # ------------------------------------------------------------------
+    def render(self):
+        """All metrics in Prometheus' text exposition format"""
+        lines = []
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            lines += ["# HELP todo_requests_total Requests handled, by endpoint and status code.",
+                      "# TYPE todo_requests_total counter"]
+            for endpoint, stats in endpoints:
+                for status, count in sorted(stats.requests.items()):
+                    lines.append(f'todo_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+            lines += ["# HELP todo_request_duration_seconds Request latency.",
+                      "# TYPE todo_request_duration_seconds histogram"]
+            for endpoint, stats in endpoints:
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    lines.append(f'todo_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'todo_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {stats.count}')
+                lines.append(f'todo_request_duration_seconds_sum{{endpoint="{endpoint}"}} {stats.latency:.6f}')
+                lines.append(f'todo_request_duration_seconds_count{{endpoint="{endpoint}"}} {stats.count}')
+            lines += ["# HELP todo_request_queries_total SQL statements executed by requests.",
+                      "# TYPE todo_request_queries_total counter"]
+            for endpoint, stats in endpoints:
+                lines.append(f'todo_request_queries_total{{endpoint="{endpoint}"}} {stats.queries}')
+            lines += ["# HELP todo_request_db_seconds_total Time spent in SQL statements by requests.",
+                      "# TYPE todo_request_db_seconds_total counter"]
+            for endpoint, stats in endpoints:
+                lines.append(f'todo_request_db_seconds_total{{endpoint="{endpoint}"}} {stats.db_time:.6f}')
+        for name, help, collect in self.gauges:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+            for labels, value in collect().items():
+                lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
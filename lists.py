@@ -0,0 +1,158 @@
+"""
+    Pages of the to-do lists: my lists, create / rename / archive / copy / delete a list
+"""
+from datetime import datetime
+import shortuuid
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
+from flask_login import login_required, current_user
+from main import (logger, render_my_lists, invalidate_sidebar, set_archive, delete_list, is_cold,
+                  allocate_name, task_order, adjust_counters)
+from models import db, List, Task, ListArchive
+
+bp = Blueprint("lists", __name__)
+
+
+@bp.route("/", methods=["GET"])
+def home():
+    """The top page of To-do Manager before Login"""
+    return render_template('index.html')
+
+@bp.route("/my_lists", methods=["GET"])
+def mylists():
+    """
+        The Top page of To-do Manager after login
+        - Listing up all existing To-do Lists of this user
+        - Each To-do List can be deleted or clicked to check all linked Tasks in it
+        
+    """
+    return render_template("lists.html", my_lists=render_my_lists(current_user.id))
+
+@bp.route("/new_list", methods=["GET", "POST"])
+@login_required
+def new_list():
+    """
+        Create a new To-do list
+        The default list name may add a symbol when there're duplicates
+        eg. New list 2024-05-29 (1)
+    """
+    time = datetime.today()
+    date = time.strftime('%Y-%m-%d')
+    day_of_week = time.strftime('%a')
+    l_name = f"To-do list :  {date} ({day_of_week})"
+
+    with current_app.app_context():   
+        url_key = shortuuid.ShortUUID().random(length=10)
+        user_id = current_user.id
+        l_name = allocate_name(f"user:{user_id}", l_name, List.name, List.user_id == user_id)
+        n_list = List(name = l_name, url_key = url_key, created_date=time, task_cnt=0, done_cnt=0, archive=False, user_id=user_id)
+        db.session.add(n_list)
+        invalidate_sidebar(user_id)
+        db.session.commit()
+        flash(f'A new list: {l_name} created!', "success")
+        logger.debug("New list created: %s", n_list)
+        return redirect(url_for("tasks.new_task", url_key=url_key))
+
+@bp.route("/edit_name/<url_key>", methods=["GET", "POST"])
+def edit_l_name(url_key):
+    """Allow user to change list name"""
+    with current_app.app_context():
+        p_list = db.session.query(List).filter(List.url_key == url_key).first()
+        if request.method == "POST":
+            new_name = request.form['new-name']
+            p_list.name = new_name
+            invalidate_sidebar(p_list.user_id)
+            db.session.commit()
+            flash("✓ List's name has been updated!", "success")
+            logger.debug("List %s renamed to: %s", p_list.id, new_name)
+    return redirect(url_for("tasks.new_task", url_key=url_key))
+
+@bp.route('/archive/<url_key>', methods=["GET", "POST"])
+@login_required
+def archive_list(url_key):
+    """Allow user to archive a list to database"""
+    with current_app.app_context():
+        p_list = db.session.query(List).filter(List.url_key == url_key).first()
+        if p_list.archive == True:
+            set_archive(p_list, False)
+            flash(f'"{p_list.name}" has been unarchived! you can check it in your "Mylists".', 'success')
+        else:
+            set_archive(p_list, True)
+            flash(f'"{p_list.name}" has been archived!', 'success')
+        db.session.commit()
+        return redirect(url_for('lists.mylists'))
+
+@bp.route("/archived", methods=["GET"])
+@login_required
+def archived_lists():
+    """
+        The archived lists of the user, newest first, ARCHIVE_PAGE_SIZE per page.
+        Paged by list id (?before=<id>): each page is one range on the (user_id, archive) index.
+    """
+    page_size = current_app.config["ARCHIVE_PAGE_SIZE"]
+    query = db.session.query(List, ListArchive.archived_date).outerjoin(
+        ListArchive, ListArchive.list_id == List.id
+    ).filter(List.user_id == current_user.id, List.archive == True)
+    before = request.args.get("before", type=int)
+    if before:
+        query = query.filter(List.id < before)
+    rows = query.order_by(List.id.desc()).limit(page_size + 1).all()
+    next_before = rows[page_size - 1][0].id if len(rows) > page_size else None
+    return render_template("archived.html", archived=rows[:page_size], next_before=next_before)
+
+@bp.route("/del/<url_key>", methods=["GET", "POST"])
+def del_list(url_key):
+    """Allow uer to delete a list from mylists page"""
+    with current_app.app_context():
+        d_list = db.session.query(List).filter(List.url_key == url_key).first()
+        if d_list:
+            delete_list(d_list)
+            invalidate_sidebar(d_list.user_id)
+            db.session.commit()
+            flash(f'✓ "{d_list.name}" deleted successfully!', "success")
+        else:
+            flash(f'❗️List "{url_key}" not found', "error")
+        p_list = db.session.query(List).filter(
+            List.user_id == current_user.id, List.archive == False
+        ).order_by(List.id.desc()).first()
+        if not p_list:
+            return redirect(url_for('lists.mylists'))
+        return redirect(url_for('tasks.new_task', url_key=p_list.url_key))
+
+@bp.route("/copy/<url_key>", methods=["GET", "POST"])
+def copy_list(url_key):
+    """
+        Copy a exist To-do list along with all tasks under it;
+        list name format: name of exist list (copy)
+        Different points: 
+            - url_key
+            - list id, list name, create date
+            - task id
+    """
+    new_url_key = shortuuid.ShortUUID().random(length=10)
+    time = datetime.today()
+    with current_app.app_context():
+        p_list = db.session.query(List).filter(List.url_key == url_key).first()
+        if is_cold(p_list):
+            flash(f'"{p_list.name}" is archived: unarchive it to copy it.', "error")
+            return redirect(url_for('lists.archived_lists'))
+        l_name = f"{p_list.name} (copy)"
+        n_list = List(name = l_name, url_key = new_url_key, created_date=time, task_cnt=0, done_cnt=0, archive=False, user_id=current_user.id)
+        db.session.add(n_list)
+        db.session.flush()
+        # INSERT ... SELECT: the tasks are copied by the database, in the same transaction as the list.
+        # The counters count what was copied, so a source whose counters drifted doesn't pass it on
+        copied = db.session.execute(
+            db.insert(Task).from_select(
+                ["name", "due_date", "status", "favorit", "position", "list_id"],
+                db.select(Task.name, Task.due_date, Task.status, Task.favorit, Task.position, db.literal(n_list.id))
+                .where(Task.list_id == p_list.id)
+                .order_by(*task_order())
+            )
+        ).rowcount
+        if copied:
+            done = db.session.query(db.func.count(Task.id)).filter(Task.list_id == n_list.id, Task.status == True).scalar()
+            adjust_counters(n_list.id, tasks=copied, done=done)
+        invalidate_sidebar(current_user.id)
+        db.session.commit()
+        flash('✓ List copied successfully! Click the pencil mark to change list name.', "success")
+        return redirect(url_for("tasks.new_task", url_key=new_url_key))
@@ -0,0 +1,199 @@
+"""
+    HTTP load test of a running server: requests/s and latency percentiles of the hot pages.
+    Usage:
+        python loadtest.py [--url URL] [--server dev|gunicorn] [--clients N] [--duration SECONDS]
+                           [--lists N] [--tasks N] [--scenarios mylists new_task]
+
+    A user with `lists` lists of `tasks` tasks each is seeded through the pages (register, new_list, new_task),
+    then every client thread logs in with its own session and keep-alive connection and requests
+    the page of its scenario in a loop for `duration` seconds:
+        mylists   GET /my_lists
+        new_task  GET /task/<url_key>   (the lists are visited in turn)
+    --server starts the server on a fresh SQLite database (LOADTEST_DATABASE_URL to use another one)
+    and stops it afterwards, so that the serving modes can be compared side by side:
+        dev       the Flask development server (threaded)
+        gunicorn  gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import argparse
+import http.client
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlencode, urlsplit
+
+CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+URL_KEY_RE = re.compile(r"/task/([A-Za-z0-9]+)")
+PASSWORD = "loadtest-password"
+
+
+class Client:
+    """One keep-alive HTTP connection with its own cookies (a logged-in browser)"""
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        self.cookies = {}
+
+    def request(self, method, path, form=None):
+        """Return (status, body text, Location header)"""
+        headers = {}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        self.conn.request(method, path, body=body, headers=headers)
+        response = self.conn.getresponse()
+        text = response.read().decode("utf-8", "replace")
+        for cookie in response.msg.get_all("Set-Cookie") or []:
+            name, _, value = cookie.split(";", 1)[0].partition("=")
+            self.cookies[name.strip()] = value
+        return response.status, text, response.getheader("Location")
+
+    def submit(self, path, form):
+        """POST a form of the page at `path`, with the CSRF token of that page"""
+        status, page, _ = self.request("GET", path)
+        token = CSRF_RE.search(page)
+        if token:
+            form = dict(form, csrf_token=token.group(1))
+        return self.request("POST", path, form)
+
+    def close(self):
+        self.conn.close()
+
+
+def seed(url, email, lists, tasks):
+    """Register `email` and create its lists and tasks, return the url_keys of the lists"""
+    client = Client(url)
+    status, _, _ = client.submit("/register", {"email": email, "password": PASSWORD, "name": "Load test"})
+    assert status == 302, f"register -> {status}"
+    url_keys = []
+    for _ in range(lists):
+        status, _, location = client.request("GET", "/new_list")
+        url_key = URL_KEY_RE.search(location or "")
+        assert url_key, f"new_list -> {status}"
+        url_keys.append(url_key.group(1))
+        for i in range(tasks):
+            client.submit(f"/task/{url_key.group(1)}", {"name": f"task {i}"})
+    client.close()
+    return url_keys
+
+
+def login(url, email):
+    client = Client(url)
+    status, _, _ = client.submit("/login", {"email": email, "password": PASSWORD})
+    assert status == 302, f"login -> {status}"
+    return client
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def run_scenario(url, email, paths, clients, duration):
+    """Request `paths` in turn from `clients` threads for `duration` seconds; return (count, errors, latencies)"""
+    latencies, errors = [], []
+    sessions = [login(url, email) for _ in range(clients)]
+    deadline = time.perf_counter() + duration
+
+    def client_loop(client, offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                status, _, _ = client.request("GET", path)
+            except (OSError, http.client.HTTPException):
+                errors.append(path)
+                client.conn.close()
+                continue
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(path)
+
+    workers = [threading.Thread(target=client_loop, args=(client, n)) for n, client in enumerate(sessions)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    for client in sessions:
+        client.close()
+    return len(latencies), len(errors), latencies
+
+
+def wait_ready(url, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"The server exited with status {process.returncode}")
+        try:
+            client = Client(url)
+            status, _, _ = client.request("GET", "/healthz")
+            client.close()
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    sys.exit("The server didn't start")
+
+
+def start_server(kind, url):
+    """Start a server of `kind` listening on `url` with a fresh database, return the process"""
+    parts = urlsplit(url)
+    db_file = os.path.join(tempfile.mkdtemp(prefix="todo-load-"), "load.db")
+    env = dict(os.environ, DATABASE_URL=os.getenv("LOADTEST_DATABASE_URL", f"sqlite:///{db_file}"),
+               LOG_LEVEL="WARNING", SLOW_REQUEST_MS="100000")
+    env.setdefault("SECRET_KEY", uuid.uuid4().hex)
+    if kind == "dev":
+        command = [sys.executable, "-m", "flask", "--app", "main", "run",
+                   "--host", parts.hostname, "--port", str(parts.port), "--with-threads"]
+    else:
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                   "--bind", f"{parts.hostname}:{parts.port}", "--access-logfile", os.devnull, "wsgi:app"]
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, "-m", "flask", "--app", "main", "init-db"], env=env, cwd=cwd,
+                   check=True, stdout=subprocess.DEVNULL)
+    process = subprocess.Popen(command, env=env, cwd=cwd)
+    wait_ready(url, process)
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--server", choices=["dev", "gunicorn"])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--lists", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--scenarios", nargs="+", choices=["mylists", "new_task"], default=["mylists", "new_task"])
+    args = parser.parse_args()
+
+    process = start_server(args.server, args.url) if args.server else None
+    try:
+        email = f"load-{uuid.uuid4().hex[:8]}@example.com"
+        url_keys = seed(args.url, email, args.lists, args.tasks)
+        scenarios = {"mylists": ["/my_lists"], "new_task": [f"/task/{key}" for key in url_keys]}
+        print(f"{args.server or args.url}: {args.clients} clients, {args.duration:.0f}s per scenario,"
+              f" {args.lists} lists x {args.tasks} tasks")
+        print(f"{'scenario':>10} | {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'errors':>7}")
+        for name in args.scenarios:
+            count, errors, latencies = run_scenario(args.url, email, scenarios[name], args.clients, args.duration)
+            print(f"{name:>10} | {count / args.duration:>8.1f} {percentile(latencies, 50) * 1000:>9.1f}"
+                  f" {percentile(latencies, 99) * 1000:>9.1f} {errors:>7}")
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
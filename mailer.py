@@ -0,0 +1,119 @@
+"""
+    Outgoing mail over a small pool of reused SMTP connections.
+
+    Opening an SMTP session (connect, STARTTLS, login) costs several round trips,
+    so connections are kept open between messages and shared by the sending threads.
+    Transient failures (dropped connection, network error, 4xx reply) are retried with a backoff
+    on a fresh connection; a 5xx reply is permanent and raised at once.
+"""
+import queue
+import smtplib
+import threading
+import time
+
+
+class SMTPPool:
+    """
+        - host / port / use_tls: SMTP server, STARTTLS when use_tls
+        - username / password: login, skipped when no username
+        - size: number of connections open at once
+        - retries: attempts after the first one, backoff: seconds before the first retry (doubled each time)
+        - timeout: socket timeout of a connection, and seconds to wait for a free one
+    """
+    def __init__(self, host, port, use_tls=True, username=None, password=None,
+                 size=2, retries=3, backoff=1.0, timeout=30, smtp_class=smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.smtp_class = smtp_class
+        self.sent = 0
+        self.failed = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        conn = self.smtp_class(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                conn.starttls()
+            if self.username:
+                conn.login(self.username, self.password)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("No free SMTP connection")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return self._connect()
+            except BaseException:
+                self._slots.release()
+                raise
+
+    def _release(self, conn, broken=False):
+        if broken:
+            try:
+                conn.close()
+            except OSError:
+                pass
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+    @staticmethod
+    def transient(error):
+        """Whether a failed send may succeed when retried (smtplib's exceptions are OSErrors too)"""
+        if isinstance(error, smtplib.SMTPResponseException):
+            return 400 <= error.smtp_code < 500
+        if isinstance(error, smtplib.SMTPServerDisconnected):
+            return True
+        return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+    def send(self, message):
+        """Send an email.message.EmailMessage, retrying transient failures"""
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            conn = None
+            try:
+                conn = self._acquire()
+                conn.send_message(message)
+            except Exception as error:
+                if conn is not None:
+                    self._release(conn, broken=True)
+                if attempt == self.retries or not self.transient(error):
+                    self.failed += 1
+                    raise
+            else:
+                self._release(conn)
+                self.sent += 1
+                return
+            time.sleep(delay)
+            delay *= 2
+
+    def close(self):
+        """Quit the idle connections"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                conn.quit()
+            except (smtplib.SMTPException, OSError):
+                conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
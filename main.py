@@ -6,463 +6,571 @@
     pip install flask_sqlalchemy
     pip install flask-login
     pip install mysqlclient
+
+    create_app() builds the app; the routes are in blueprints (auth.py, lists.py, tasks.py, api.py)
+    and the CLI commands in commands.py. This module keeps what they share.
 """
+import json
+import logging
+import zlib
 from datetime import datetime
 import shortuuid
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, Blueprint, current_app, render_template, abort, jsonify
 from flask_bootstrap import Bootstrap
-from flask_wtf import FlaskForm
 from flask_wtf.csrf import CSRFProtect
-from wtforms import StringField, BooleanField, SubmitField, PasswordField
-from wtforms.validators import DataRequired, Email, Length
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import relationship
-from sqlalchemy import case
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_login import UserMixin, login_user, LoginManager, login_required, current_user, logout_user
+from markupsafe import Markup
+from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, text, and_, or_
+from flask_login import LoginManager, current_user
+from werkzeug.local import LocalProxy
 import config
-
-# ============================================================================
-app = Flask(__name__)
-app.config.from_object(config.conf)
-
-Bootstrap(app)
-csrf = CSRFProtect(app)
-
-# ============================================================================
-# Connect to Database
-db = SQLAlchemy(app)
+from cache import FragmentCache, LRUCache, TTLCache
+from hashing import HashingPool
+from instrumentation import RequestMetrics
+import search
+import transfer
+from transfer import ImportFormatError
+from models import db, DATE_FORMAT, column_value, User, UserPrincipal, List, Task, ListArchive, NameSuffix
+
+logger = logging.getLogger("todo")
 login_manager = LoginManager()
-login_manager.init_app(app)
+csrf = CSRFProtect()
+ops = Blueprint("ops", __name__)
 
 
-class User(UserMixin, db.Model):
-    """ User Register Form """
-    __tablename__ = "users"
+def app_state(name):
+    """The `name` object of the current app, see create_app(): caches and pools are made per app"""
+    return LocalProxy(lambda: current_app.extensions["todo"][name])
 
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    email = db.Column(db.String(100), unique=True)
-    password = db.Column(db.String(100))
-    name = db.Column(db.String(1000))
+metrics = app_state("metrics")
+password_pool = app_state("password_pool")
+sidebar_cache = app_state("sidebar_cache")
+user_cache = app_state("user_cache")
 
-    addresses = db.relationship('List', backref='users', lazy=True)
 
-class List(db.Model):
+def create_app(config_object=None):
     """
-        To-do List TABLE Configuration. 
-
-        url_key: a key to link user and lists
-        ForiegnKey: user_id
+        Build the app with the settings of `config_object` (config.conf by default).
+        Nothing connects to the database here: the schema is created by `flask init-db` (or upgrade-db),
+        so a worker or CLI process starts without a round trip, even when the database is down.
     """
-    __tablename__ = "lists"
-
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    url_key = db.Column(db.String(250), nullable=False, unique=True)
-    name = db.Column(db.String(250), nullable=False, unique=False)
-    created_date = db.Column(db.String(250), nullable=False, unique=False)
-    task_cnt = db.Column(db.String(20), nullable=False, unique=False)
-    archive = db.Column(db.Boolean)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    
-    addresses = db.relationship('Task', backref='lists', lazy=True)
-    addresses = db.relationship('User', backref='lists', lazy=True)
-
-    def to_dict(self):
-        """
-            Package all items into a dict in order to more convinient usage afterward.
-            For loop and save all columns into a dict, return this dict
-        """
-        return {column.name: getattr(self, column.name) for column in self.__table__.columns}
-
-    def __repr__(self):
-        """Preset the key info to be printed"""
-        return f"List: <{self.id}, {self.name}, {self.url_key}, {self.user_id}>"
+    app = Flask(__name__)
+    app.config.from_object(config_object or config.conf)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", config.engine_options(app.config))
+
+    logging.basicConfig(level=app.config["LOG_LEVEL"], format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    Bootstrap(app)
+    csrf.init_app(app)
+    db.init_app(app)
+    login_manager.init_app(app)
+
+    state = app.extensions["todo"] = {
+        "metrics": RequestMetrics(app),
+        "password_pool": HashingPool(
+            method=app.config["PASSWORD_HASH_METHOD"],
+            salt_length=app.config["PASSWORD_SALT_LENGTH"],
+            workers=app.config["PASSWORD_HASH_WORKERS"],
+            max_queue=app.config["PASSWORD_HASH_QUEUE"],
+            timeout=app.config["PASSWORD_HASH_TIMEOUT"],
+        ),
+        "sidebar_cache": FragmentCache(
+            app.config["SIDEBAR_CACHE_BACKEND"] or LRUCache(app.config["SIDEBAR_CACHE_SIZE"]),
+            prefix="sidebar",
+        ),
+        "user_cache": TTLCache(app.config["USER_CACHE_SIZE"], app.config["USER_CACHE_TTL"]),
+        "search_indexes": TTLCache(app.config["SEARCH_INDEX_CACHE_SIZE"], app.config["SEARCH_INDEX_TTL"]),
+    }
+    state["metrics"].add_gauge("todo_cache_hits", "Cache hits of this worker.", lambda: {
+        'cache="sidebar"': state["sidebar_cache"].hits, 'cache="user"': state["user_cache"].hits,
+    })
+    state["metrics"].add_gauge("todo_cache_misses", "Cache misses of this worker.", lambda: {
+        'cache="sidebar"': state["sidebar_cache"].misses, 'cache="user"': state["user_cache"].misses,
+    })
+    state["metrics"].add_gauge("todo_password_hash_rejected", "Logins / sign-ups turned away by the busy hashing pool.", lambda: {
+        "": state["password_pool"].rejected,
+    })
+
+    # The blueprints import this module: imported here rather than at the top
+    import api
+    import auth
+    import commands
+    import lists
+    import tasks
+    for blueprint in (ops, auth.bp, lists.bp, tasks.bp, api.bp, commands.bp):
+        app.register_blueprint(blueprint)
+    return app
+
+
+def init_db():
+    """Create the missing tables and full-text search indexes; return the search backend"""
+    db.create_all()
+    with db.engine.begin() as conn:
+        return search.setup(conn, current_app.config["SEARCH_BACKEND"])
 
-class Task(db.Model):
+# ============================================================================
+# Sidebar / list-page fragment cache
+
+def user_lists(user_id):
+    """Cached rows (url_key, name, task_cnt) of the active lists of a user, in creation order"""
+    def load():
+        rows = db.session.query(List.url_key, List.name, List.task_cnt).filter(
+            List.user_id == user_id, List.archive == False
+        ).order_by(List.id)
+        return [row._asdict() for row in rows]
+    return sidebar_cache.get_or_set(user_id, "lists", load)
+
+def render_sidebar(user_id, url_key):
+    """Rendered sidebar of the task page, with `url_key` as current list"""
+    return Markup(sidebar_cache.get_or_set(user_id, f"sidebar:{url_key}", lambda: render_template(
+        "_sidebar.html", all_list=user_lists(user_id), current_key=url_key
+    )))
+
+def render_my_lists(user_id):
+    """Rendered active lists of the "My saved Lists" page"""
+    return Markup(sidebar_cache.get_or_set(user_id, "my_lists", lambda: render_template(
+        "_my_lists.html", all_list=user_lists(user_id)
+    )))
+
+def invalidate_sidebar(user_id):
     """
-        Task TABLE Configuration. 
-        ForiegnKey: list_id
+        Mark the cached lists of a user as stale.
+        The version stamp is bumped once the current transaction commits,
+        so no request can cache the old rows again in between.
     """
-    __tablename__ = "tasks"
-
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    name = db.Column(db.String(250), unique=False, nullable=False)
-    due_date = db.Column(db.String(100), nullable=True) # format: "%Y-%m-%d %H:%M:%S"
-    status = db.Column(db.Boolean)
-    favorit = db.Column(db.Boolean, nullable=True)
-    list_id = db.Column(db.Integer, db.ForeignKey('lists.id'), nullable=False)
-
-    addresses = db.relationship('List', backref='tasks', lazy=True)
-
-    def to_dict(self):
-        """
-            Package all items into a dict in order to more convinient usage afterward.
-            For loop and save all columns into a dict, return this dict
-        """
-        return {column.name: getattr(self, column.name) for column in self.__table__.columns}
+    db.session.info.setdefault("stale_sidebars", set()).add(user_id)
+
+@event.listens_for(Session, "after_commit")
+def bump_sidebar_versions(session):
+    for user_id in session.info.pop("stale_sidebars", ()):
+        sidebar_cache.invalidate(user_id)
+
+@event.listens_for(Session, "after_soft_rollback")
+def drop_sidebar_versions(session, previous_transaction):
+    session.info.pop("stale_sidebars", None)
+
+# Logged-in user cache: user_cache.hits is the number of user queries saved
+def invalidate_user(user_id):
+    """Drop a cached user once the current transaction commits"""
+    db.session.info.setdefault("stale_users", set()).add(user_id)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def user_changed(mapper, connection, user):
+    """Profile or password changed: the cached principal is stale"""
+    invalidate_user(user.id)
+
+@event.listens_for(Session, "after_commit")
+def drop_cached_users(session):
+    for user_id in session.info.pop("stale_users", ()):
+        user_cache.delete(user_id)
+
+@event.listens_for(Session, "after_soft_rollback")
+def keep_cached_users(session, previous_transaction):
+    session.info.pop("stale_users", None)
+
+@ops.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Request, SQL and cache metrics of this worker in Prometheus' text format"""
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+@ops.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    """Hit / miss counters of the caches of this worker"""
+    return jsonify(sidebar=sidebar_cache.stats(), user=user_cache.stats())
+
+@ops.route("/healthz", methods=["GET"])
+def healthz():
+    """
+        Health check: the database answers, and the state of the connection pool of this worker
+        (checked out = in use by requests, idle = open and ready).
+    """
+    pool = db.engine.pool
+    stats = {"pool": pool.__class__.__name__}
+    for name, method in (("size", "size"), ("checked_out", "checkedout"), ("idle", "checkedin"), ("overflow", "overflow")):
+        if hasattr(pool, method):
+            stats[name] = getattr(pool, method)()
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as error:
+        return jsonify(status="error", error=str(error.__class__.__name__), **stats), 503
+    return jsonify(status="ok", **stats)
 
-    def __repr__(self):
-        """Preset the key info to be printed"""
-        return f"Card: <{self.id}, {self.name}, {self.due_date}, {self.status}, {self.favorit}, {self.list_id}>"
+# ============================================================================
+@login_manager.user_loader
+def load_user(user_id):
+    """
+        Load user's information.
+        With USER_CACHE_ENABLED, a cached UserPrincipal is returned instead of querying the users table.
+    """
+    if not current_app.config["USER_CACHE_ENABLED"]:
+        return db.session.get(User, int(user_id))
+    principal = user_cache.get(int(user_id))
+    if principal is None:
+        row = db.session.query(User.id, User.email, User.name).filter(User.id == int(user_id)).first()
+        if not row:
+            return None
+        principal = UserPrincipal(row.id, row.email, row.name)
+        user_cache.set(principal.id, principal)
+    return principal
 
+# ============================================================================
+# Archive / cold storage
+def freeze_tasks(list_id):
+    """Move the tasks of a list into its ListArchive (cold storage), in the caller's transaction"""
+    rows = db.session.execute(
+        db.select(Task.name, Task.due_date, Task.status, Task.favorit, Task.reminded_due)
+        .where(Task.list_id == list_id).order_by(*task_order())
+    )
+    tasks = [{key: column_value(value) for key, value in row._mapping.items()} for row in rows]
+    db.session.add(ListArchive(list_id=list_id, tasks=zlib.compress(json.dumps(tasks).encode()),
+                               archived_date=datetime.today()))
+    db.session.execute(db.delete(Task).where(Task.list_id == list_id))
+
+def thaw_tasks(archive):
+    """Put the tasks of a ListArchive back in the tasks table (new ids and positions, same order) and drop the archive"""
+    tasks = json.loads(zlib.decompress(archive.tasks))
+    for number, task in enumerate(tasks):
+        for key in ("due_date", "reminded_due"):
+            task[key] = datetime.strptime(task[key], DATE_FORMAT) if task[key] else None
+        task["list_id"] = archive.list_id
+        task["position"] = (number + 1) * POSITION_GAP
+    if tasks:
+        db.session.execute(db.insert(Task), tasks)
+    db.session.delete(archive)
+
+def set_archive(p_list, archive):
+    """
+        (Un)archive a list in the caller's transaction.
+        With ARCHIVE_COLD_STORAGE its tasks leave the tasks table while archived; they're restored on
+        unarchive whatever the setting is now. The counters keep counting the archived tasks.
+    """
+    if archive == p_list.archive:
+        return
+    p_list.archive = archive
+    if archive and current_app.config["ARCHIVE_COLD_STORAGE"]:
+        freeze_tasks(p_list.id)
+    elif not archive:
+        cold = db.session.get(ListArchive, p_list.id)
+        if cold:
+            thaw_tasks(cold)
+    invalidate_sidebar(p_list.user_id)
+
+def delete_list(d_list):
+    """
+        Delete a list with its tasks (one set-based DELETE), its cold storage and the name counters of its tasks,
+        in the caller's transaction
+    """
+    db.session.execute(db.delete(Task).where(Task.list_id == d_list.id))
+    db.session.execute(db.delete(ListArchive).where(ListArchive.list_id == d_list.id))
+    db.session.execute(db.delete(NameSuffix).where(NameSuffix.scope == f"list:{d_list.id}"))
+    db.session.delete(d_list)
 
-# Create table:
-with app.app_context():
-    db.create_all()
+def is_cold(p_list):
+    """True when the tasks of an archived list are in cold storage"""
+    return p_list.archive and db.session.get(ListArchive, p_list.id) is not None
 
 # ============================================================================
-class RegisterForm(FlaskForm):
+# Tasks are POSITION_GAP apart when appended or rebalanced: a move goes halfway between its new neighbours,
+# so 16 moves into the same slot fit before the list has to be renumbered
+POSITION_GAP = 1 << 16
+# Lists with neighbours closer than this are renumbered by `flask rebalance-positions`
+POSITION_MIN_GAP = POSITION_GAP >> 10
+
+def task_order():
     """
-        User to register an account to access Task Management Sysytem.
-        Infomation will be saved to the user table:
-            - email
-            - password
-            - name
+        Display order of tasks in a list: the manual order (position), served by ix_tasks_list_position.
+        Task.id makes the order total, which keyset paging relies on.
     """
-    email = StringField("Email", validators=[DataRequired()])
-    password = PasswordField("Password", validators=[DataRequired(), Length(min=8)])
-    name = StringField("Name", validators=[DataRequired()])
-    submit = SubmitField("SIGN ME UP!")
-
-class LoginForm(FlaskForm):
+    return (Task.position.asc(), Task.id.asc())
+
+def encode_cursor(task):
+    """Pack the sort key of the last task of a page into an url-safe cursor"""
+    return f"{task.position}.{task.id}"
+
+def decode_cursor(cursor):
+    """Unpack a cursor made by encode_cursor(), abort with 400 when it's malformed"""
+    try:
+        position, task_id = cursor.split(".")
+        return int(position), int(task_id)
+    except ValueError:
+        abort(400)
+
+def after_cursor(cursor):
+    """WHERE clause selecting the tasks that come after `cursor` (position, id) in task_order()"""
+    position, task_id = cursor
+    return or_(Task.position > position, and_(Task.position == position, Task.id > task_id))
+
+def page_tasks(list_id, cursor=None):
     """
-        User to login to the Task Management Sysytem.
+        Keyset pagination over task_order(): return one page of tasks of a list,
+        with the cursor of the next page (None on the last page).
+        Each page costs one bounded query, however large the list is.
     """
-    email = StringField(label='Email', validators=[DataRequired(), Email()])
-    password = PasswordField(label='Password', validators=[DataRequired(), Length(min=8)])
-    submit = SubmitField(label="Log In")
-
-class ListForm(FlaskForm):
+    page_size = current_app.config["TASK_PAGE_SIZE"]
+    query = db.session.query(Task).filter(Task.list_id == list_id)
+    if cursor:
+        query = query.filter(after_cursor(decode_cursor(cursor)))
+    tasks = query.order_by(*task_order()).limit(page_size + 1).all()
+    if len(tasks) > page_size:
+        return tasks[:page_size], encode_cursor(tasks[page_size - 1])
+    return tasks, None
+
+def next_position(list_id):
+    """Position of a task appended to a list: one MAX() read from the end of ix_tasks_list_position"""
+    last = db.session.execute(db.select(db.func.max(Task.position)).where(Task.list_id == list_id)).scalar()
+    return (last or 0) + POSITION_GAP
+
+def move_task(task, after_id):
     """
-        Add a new list under a existing board.
+        Put `task` right after the task `after_id` of its list (first in the list when None),
+        in the caller's transaction. The new position is halfway between the two neighbours:
+        one UPDATE of one row. When they're adjacent (the gap is used up), the list is rebalanced first.
     """
-    name = StringField(label='List name', validators=[DataRequired()])
-    favorit = BooleanField(label="☆")
-    submit = SubmitField(label='Submit')
+    for _ in range(2):
+        query = db.select(Task.position).where(Task.list_id == task.list_id, Task.id != task.id)
+        before = None
+        if after_id is not None:
+            before = db.session.execute(db.select(Task.position).where(Task.id == after_id)).scalar()
+            query = query.where(after_cursor((before, after_id)))
+        following = db.session.execute(query.order_by(*task_order()).limit(1)).scalar()
+        if before is None and following is None:
+            return task.position
+        if before is None:
+            position = following - POSITION_GAP
+        elif following is None:
+            position = before + POSITION_GAP
+        elif following - before > 1:
+            position = (before + following) // 2
+        else:
+            rebalance_positions(task.list_id)
+            continue
+        db.session.execute(
+            db.update(Task).where(Task.id == task.id).values(position=position)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.expire(task, ["position"])
+        return position
+    raise RuntimeError(f"No room to move task {task.id} after {after_id}")
+
+def rebalance_positions(list_id, order=None):
+    """
+        Spread the tasks of a list POSITION_GAP apart again, keeping their order (or sorting them by `order`),
+        in the caller's transaction. Return the number of tasks.
+    """
+    ids = db.session.execute(
+        db.select(Task.id).where(Task.list_id == list_id).order_by(*(order or task_order()))
+    ).scalars().all()
+    if ids:
+        db.session.execute(db.update(Task), [
+            {"id": task_id, "position": (number + 1) * POSITION_GAP} for number, task_id in enumerate(ids)
+        ])
+    return len(ids)
+
+def named_like(column, base):
+    """`column` is `base` or `base(<n>)`; a prefix range on the name index"""
+    escaped = base.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return or_(column == base, column.like(escaped + "(%)", escape="\\"))
+
+def upsert(table, values, on_conflict):
+    """INSERT `values` into `table`, or UPDATE the row with the same primary key with `on_conflict`: one statement"""
+    if db.session.get_bind().dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        return insert(table).values(values).on_duplicate_key_update(on_conflict)
+    from sqlalchemy.dialects.sqlite import insert
+    return insert(table).values(values).on_conflict_do_update(
+        index_elements=list(table.__table__.primary_key.columns), set_=on_conflict,
+    )
+
+def allocate_name(scope, base, column, *in_scope):
+    """
+        Give out `base` or `base(<n>)` so that the names of `column` (rows matching `in_scope`)
+        don't repeat, in the caller's transaction.
+        The NameSuffix counter of (scope, base) is bumped by one atomic upsert, which locks the row until
+        commit: concurrent requests can't get the same suffix, and it costs two primary key statements
+        however many rows the tables hold. When no row is named `base` any more, `base` itself is given
+        out again and the counter is left as is. When the counter was just created next to existing rows,
+        or its next suffix is already taken (a renamed row), it jumps past the highest suffix in use.
+    """
+    key = (NameSuffix.scope == scope, NameSuffix.name == base)
+    base_used = db.select(column).where(*in_scope, column == base).exists()
+    db.session.execute(upsert(NameSuffix, {"scope": scope, "name": base, "used": 1}, {
+        "used": db.case((base_used, NameSuffix.used + 1), else_=NameSuffix.used),
+    }))
+    candidate = db.literal(f"{base}(") + db.cast(NameSuffix.used - 1, db.String) + ")"
+    used, taken, candidate_taken = db.session.execute(db.select(
+        NameSuffix.used, base_used, db.select(column).where(*in_scope, column == candidate).exists(),
+    ).where(*key)).one()
+    if not taken:
+        return base
+    if used == 1 or candidate_taken:
+        # "base(12)" -> 12 (0 for base itself)
+        suffix = db.cast(db.func.substr(column, len(base) + 2), db.Integer)
+        highest = db.session.execute(
+            db.select(db.func.max(suffix)).where(*in_scope, named_like(column, base))
+        ).scalar() or 0
+        used = max(used, highest + 2)
+        db.session.execute(db.update(NameSuffix).where(*key, NameSuffix.used < used).values(used=used))
+    return f"{base}({used - 1})"
+
+def adjust_counters(list_id, tasks=0, done=0, user_id=None):
+    """
+        Shift the task_cnt / done_cnt counters of a list in the caller's transaction.
+        The increment is done by the database, so concurrent requests don't lose updates.
+        task_cnt is shown in the sidebar, so changing it invalidates the cached lists of the user
+        (the list owner: `user_id`, or the current user).
+    """
+    if tasks:
+        invalidate_sidebar(current_user.id if user_id is None else user_id)
+    db.session.execute(
+        db.update(List)
+        .where(List.id == list_id)
+        .values(task_cnt=List.task_cnt + tasks, done_cnt=List.done_cnt + done)
+    )
+
+class TaskVersionConflict(Exception):
+    """Raised when a task has changed since the version a client sent"""
+
+# Columns of a task whose change moves its version on (not bookkeeping such as reminded_due)
+TASK_VERSIONED = ("name", "due_date", "position", "status", "favorit")
+
+@event.listens_for(Task, "before_update")
+def bump_task_version(mapper, connection, task):
+    """
+        An ORM change of a task moves its version on by one (bulk UPDATEs set it themselves),
+        unless the version was set in the same flush already
+    """
+    attrs = inspect(task).attrs
+    if any(attrs[name].history.has_changes() for name in TASK_VERSIONED) and not attrs.version.history.has_changes():
+        task.version = Task.version + 1
 
-class TaskForm(FlaskForm):
+def set_task_flag(task_id, list_id, field, value, version=None):
     """
-        Add a new task to a existing list
+        Set the "status" or "favorit" `field` of a task of a list to `value`, in the caller's transaction.
+        One conditional UPDATE, no read-modify-write: the row only changes when it isn't at `value` yet,
+        so a replayed or double-submitted request changes nothing and done_cnt moves with the row only.
+        With `version` (the one the client saw), a task changed since then raises TaskVersionConflict,
+        unless it already is at `value`. Return True when the task changed, False when it was already
+        at `value`, None when the list has no such task.
     """
-    name = StringField(label='Title:', validators=[DataRequired()])
-    due_date = StringField(label='Due Date:')
-    status = BooleanField(label="Status:")
-    favorit = BooleanField(label="☆")
-    submit = SubmitField(label='Submit')
+    column = getattr(Task, field)
+    query = db.update(Task).where(Task.id == task_id, Task.list_id == list_id, column != value)
+    if version is not None:
+        query = query.where(Task.version == version)
+    changed = db.session.execute(
+        query.values({field: value, "version": Task.version + 1}).execution_options(synchronize_session=False)
+    ).rowcount
+    if changed:
+        if field == "status":
+            adjust_counters(list_id, done=1 if value else -1)
+        return True
+    current = db.session.execute(db.select(column).where(Task.id == task_id, Task.list_id == list_id)).first()
+    if current is None:
+        return None
+    if current[0] != value:
+        raise TaskVersionConflict(f"Task {task_id} has changed since version {version}")
+    return False
 
 # ============================================================================
-@login_manager.user_loader
-def load_user(user_id):
-    """Load user's information"""
-    return User.query.get(user_id)
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    """
-        User Registration
-        - Flash error messages when there's a existing account
-        - Login user after the registration
-    """
-    form = RegisterForm()
-    if form.validate_on_submit():
-        email = request.form.get('email')
-        with app.app_context():
-            if db.session.query(User).filter(User.email == request.form.get('email')).first():
-                flash(f"An account is alredy signed up with \"{email}\"\nplease try other email address or move to login page instead.")
-            else:
-                hash_and_salt_pw = generate_password_hash(
-                    password = request.form.get("password"),
-                    method = 'pbkdf2:sha256',
-                    salt_length = 8
-                )
-                new_user = User(
-                    email = request.form.get('email'),
-                    password = hash_and_salt_pw,
-                    name = request.form.get('name')
-                )
-                db.session.add(new_user)
-                db.session.commit()
-                login_user(new_user)  
-                flash("✓ Signed in successfully", "success")      
-                return redirect(url_for('mylists'))
-    return render_template('register.html', form=form)
-
-@app.route('/login', methods=["GET", "POST"])
-def login():
-    """
-        User Log in to the system
-        - Flash error message when the email address not found, or password is wrong
-        - Redirect to 'lists.html' page after login
-    """
-    form = LoginForm()
-    with app.app_context():
-        if form.validate_on_submit():
-            email = request.form.get('email')
-            password = request.form.get('password')
-            user = User.query.filter_by(email=email).first()
-            print(f'User entered pw: {password}(tyle: {type(password)})')
-            if not user:
-                flash("Email not found, please try again.")
-                return redirect(url_for('login'))
-            elif not check_password_hash(user.password, password):
-                flash("❗️ Password incorrect, please try again.", "error")
-                print(f'The correct pw: {user.password}(tyle: {type(user.password)})')
-                return redirect(url_for('login'))
+# Export / import of all lists and tasks of a user, formats in transfer.py
+def export_records(user_id):
+    """
+        ("list", row) / ("task", row) records of all lists of a user.
+        One outer join ordered by list and task position, fetched TRANSFER_BATCH_SIZE rows at a time
+        (a server-side cursor where the driver has one), so memory doesn't grow with the account.
+        The tasks of a list in cold storage come from its ListArchive.
+    """
+    query = (
+        db.select(List.id, List.name, List.created_date, List.archive, Task.id.label("task_id"),
+                  Task.name.label("task_name"), Task.due_date, Task.status, Task.favorit,
+                  ListArchive.tasks.label("cold_tasks"))
+        .outerjoin(Task, Task.list_id == List.id)
+        .outerjoin(ListArchive, ListArchive.list_id == List.id)
+        .where(List.user_id == user_id)
+        .order_by(List.id, *task_order())
+        .execution_options(yield_per=current_app.config["TRANSFER_BATCH_SIZE"])
+    )
+    current = None
+    for row in db.session.execute(query):
+        if row.id != current:
+            current = row.id
+            yield "list", {"name": row.name, "created_date": column_value(row.created_date), "archive": row.archive}
+            if row.cold_tasks is not None:
+                for task in json.loads(zlib.decompress(row.cold_tasks)):
+                    yield "task", {field: task[field] for field in transfer.TASK_FIELDS}
+        if row.task_id is not None:
+            yield "task", {"name": row.task_name, "due_date": column_value(row.due_date),
+                           "status": row.status, "favorit": row.favorit}
+
+def import_date(value, field):
+    """A DATE_FORMAT date of an imported record, None when empty"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, DATE_FORMAT)
+    except (TypeError, ValueError):
+        raise ImportFormatError(f'"{field}" must be formatted as {DATE_FORMAT}, got {value!r}')
+
+def import_records(user_id, records):
+    """
+        Add the lists and tasks of `records` to a user; return the (lists, tasks) counts.
+        Like new_list, every list gets a new url_key and a "(n)" suffix when the user already has its name;
+        its tasks keep the order of the records.
+        Tasks are bulk-inserted and committed TRANSFER_BATCH_SIZE records at a time, so a big import
+        holds neither memory nor one long transaction. A bad record stops the import with ImportFormatError,
+        the batches before it stay committed.
+    """
+    batch_size = current_app.config["TRANSFER_BATCH_SIZE"]
+    scope = f"user:{user_id}"
+    lists = tasks = pending = 0
+    list_id, position, batch = None, 0, []
+
+    def insert_tasks():
+        if batch:
+            db.session.execute(db.insert(Task), batch)
+            done = sum(1 for row in batch if row["status"])
+            adjust_counters(list_id, tasks=len(batch), done=done, user_id=user_id)
+            batch.clear()
+
+    try:
+        for kind, row in records:
+            if kind == "list":
+                insert_tasks()
+                base = row["name"] or "Imported list"
+                l_name = allocate_name(scope, base, List.name, List.user_id == user_id)
+                n_list = List(name=l_name, url_key=shortuuid.ShortUUID().random(length=10),
+                              created_date=import_date(row["created_date"], "created_date") or datetime.today(),
+                              task_cnt=0, done_cnt=0, archive=bool(row["archive"]), user_id=user_id)
+                db.session.add(n_list)
+                db.session.flush()
+                list_id, position = n_list.id, 0
+                invalidate_sidebar(user_id)
+                lists += 1
             else:
-                login_user(user)
-                flash("✓ Signed in successfully", "success")
-                return redirect(url_for('mylists'))
-    return render_template("login.html", form=form)
-
-
-@app.route('/logout', methods=['GET'])
-@login_required
-def logout():
-    """Log out and back to the home page"""
-    if current_user.is_authenticated:
-        logout_user()
-    return redirect(url_for('home'))
-
-# =======================================================
-@app.route("/", methods=["GET"])
-def home():
-    """The top page of To-do Manager before Login"""
-    return render_template('index.html')
-
-@app.route("/my_lists", methods=["GET"])
-def mylists():
-    """
-        The Top page of To-do Manager after login
-        - Listing up all existing To-do Lists of this user
-        - Each To-do List can be deleted or clicked to check all linked Tasks in it
-        
-    """
-    with app.app_context():
-        my_lists = db.session.query(List).filter(List.user_id == current_user.id, List.archive == False).all()
-        print(f'current user id: {current_user.id}, lists: {my_lists}')
-    return render_template("lists.html", all_list=my_lists)
-
-@app.route("/new_list", methods=["GET", "POST"])
-@login_required
-def new_list():
-    """
-        Create a new To-do list
-        The default list name may add a symbol when there're duplicates
-        eg. New list 2024-05-29 (1)
-    """
-    date = datetime.today().strftime('%Y-%m-%d')
-    time = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
-    day_of_week = datetime.today().strftime('%a')
-    l_name = f"To-do list :  {date} ({day_of_week})"
-
-    with app.app_context():   
-        url_key = shortuuid.ShortUUID().random(length=10)
-        exist_lists = db.session.query(List).filter(
-            List.user_id == current_user.id, 
-            List.name.like(l_name + "%"), 
-            List.created_date.like(date + "%")
-        ).all()
-        if len(exist_lists) > 0:
-            l_name += f'({len(exist_lists)})'
-        user_id = current_user.id
-        n_list = List(name = l_name, url_key = url_key, created_date=time, task_cnt="0", archive=False, user_id=user_id)
-        db.session.add(n_list)
-        db.session.commit()
-        flash(f'A new list: {l_name} created!', "success")
-        print(f"New list created: {n_list}. Click the pencil mark to change list name.")
-        return redirect(url_for("new_task", url_key=url_key))
-
-@app.route("/edit_name/<url_key>", methods=["GET", "POST"])
-def edit_l_name(url_key):
-    """Allow user to change list name"""
-    with app.app_context():
-        p_list = db.session.query(List).filter(List.url_key == url_key).first()
-        if request.method == "POST":
-            new_name = request.form['new-name']
-            p_list.name = new_name
-            db.session.commit()
-            flash("✓ List's name has been updated!", "success")
-            print(f"{p_list.id}'s name has been updated to: {new_name}")
-    return redirect(url_for("new_task", url_key=url_key))
-
-@app.route('/archive/<url_key>', methods=["GET", "POST"])
-@login_required
-def archive_list(url_key):
-    """Allow user to archive a list to database"""
-    with app.app_context():
-        p_list = db.session.query(List).filter(List.url_key == url_key).first()
-        if p_list.archive == True:
-            p_list.archive = False
-            flash(f'"{p_list.name}" has been unarchived! you can check it in your "Mylists".', 'success')
-        else:
-            p_list.archive = True
-            flash(f'"{p_list.name}" has been archived!', 'success')
-        db.session.commit()
-        return redirect(url_for('mylists'))
-
-@app.route("/del/<url_key>", methods=["GET", "POST"])
-def del_list(url_key):
-    """Allow uer to delete a list from mylists page"""
-    with app.app_context():
-        d_list = db.session.query(List).filter(List.url_key == url_key).first()
-        if d_list:
-            d_tasks = db.session.query(Task).filter(Task.list_id == d_list.id).all()
-            for task in d_tasks:
-                db.session.delete(task)
+                if list_id is None:
+                    raise ImportFormatError("A task comes before any list")
+                if not row["name"]:
+                    raise ImportFormatError("Task name can't be empty")
+                position += POSITION_GAP
+                batch.append({"name": row["name"], "due_date": import_date(row["due_date"], "due_date"),
+                              "status": bool(row["status"]), "favorit": bool(row["favorit"]), "list_id": list_id,
+                              "position": position})
+                tasks += 1
+            pending += 1
+            if pending >= batch_size:
+                insert_tasks()
                 db.session.commit()
-            db.session.delete(d_list)
-            db.session.commit()
-            flash(f'✓ "{d_list.name}" deleted successfully!', "success")
-        else:
-            flash(f'❗️"{d_list.name}" not found', "error")
-    with app.app_context():
-        p_list = db.session.query(List).filter(List.user_id == current_user.id).all()[::-1][0]
-        p_url_key = p_list.url_key
-        db.session.commit()
-        return redirect(url_for('new_task', url_key=p_url_key))
-    
-# =======================================================   
-@app.route('/task/<url_key>', methods=["GET", "POST"])
-def new_task(url_key):
-    """Create a New Task without log-in"""
-    task_form = TaskForm()
-    t_name = request.form.get('name')
-    with app.app_context():
-        all_list = db.session.query(List).filter(List.user_id == current_user.id).all()
-        p_list = db.session.query(List).filter(List.url_key == url_key).first()
-        if t_name:
-            duplicate = db.session.query(List, Task).filter(List.url_key == url_key, Task.name.like(t_name + "%")).all()
-            if len(duplicate) > 0:
-                t_name = f'{t_name}({len(duplicate)})'
-        if task_form.validate_on_submit():
-            n_task = Task(
-                name = t_name,
-                list_id = p_list.id,
-                )
-            db.session.add(n_task)
-            db.session.commit()
-            print(f"New card submitted: {n_task}")
-            flash("✓ Great, a new task created. you can add a due date or mark it as favorit.", "success")
-    
-        status_case = case((Task.status == True, 1), (Task.status == False, 0))
-        favorit_case = case((Task.favorit == True, 1), (Task.favorit == False, 0))
-        due_date_case = case((Task.due_date == None, 1), (Task.due_date != None, 0))
-        p_task = db.session.query(Task).filter(Task.list_id == p_list.id).order_by(
-            status_case.desc(),
-            favorit_case.asc(),
-            due_date_case.desc(),
-            Task.due_date.desc()
-        ).all()
-        p_list.task_cnt = len(p_task)
-        db.session.commit()
-        print(len(p_task), p_task)
-        return render_template('tasks.html', all_list=all_list, form=task_form, list=p_list, url_key=url_key, all_task=p_task)
-
-@app.route("/edit_task_name/<url_key>/<id>", methods=["GET", "POST"])
-def edit_t_name(url_key, id):
-    """Allow user to change task name"""
-    print(f'task_id = {id}')
-    with app.app_context():
-        task = db.session.query(Task).filter(Task.id == id).first()
-        print(f"被选中修改名称的 task: {task.name}")
-        task.name = request.form['new-t-name']
-        db.session.commit()
-        flash("✓ Task's name has been updated!", "success")
-        print(f"{task.id}'s name has been updated to: {task.name}")
-        return redirect(url_for("new_task", url_key=url_key))
-
-@app.route("/date/<url_key>/<id>", methods=["GET", "POST"])
-def new_date(url_key, id):
-    """Allow user to add task due date"""
-    with app.app_context():
-        task = db.session.query(Task).filter(Task.id == id).first()
-        task.due_date = request.form['due_date']
-        db.session.commit()
-        flash(f'✓ Due date of task: "{task.name}" has been added!', 'success')
-        return redirect(url_for('new_task', url_key=url_key))
-
-@app.route("/complete/<url_key>/<id>", methods=["GET", "POST"])
-def complete(url_key, id):
-    """Allow user to change status of task"""
-    with app.app_context():
-        task = db.session.query(Task).filter(Task.id == id).first()
-        if task.status:
-            task.status = False
-            flash(f'Status of task: "{task.name}" has been changed!', 'success')
-        else:
-            task.status = True
-            flash(f'Status of task: "{task.name}" has been changed to completed!', 'success')
-        db.session.commit()
-    with app.app_context():
-        p_list = db.session.query(List).filter(List.url_key == url_key).first()
-        all_tasks = db.session.query(Task).filter(Task.list_id == p_list.id).all()
-        completed_tasks = [task for task in all_tasks if task.status]
-        print(f'list:{p_list.name} has {len(all_tasks)} tasks, now finished {len(completed_tasks)} tasks.')
-        if len(all_tasks) == len(completed_tasks):
-            flash('All tasks finished! Good job!', 'success')
-        db.session.commit()    
-    return redirect(url_for('new_task', url_key=url_key))
-
-@app.route("/favorit/<url_key>/<id>", methods=["GET", "POST"])
-def check_favorit(url_key, id):
-    """Allow user to star a task"""
-    with app.app_context():
-        task = db.session.query(Task).filter(Task.id == id).first()
-        if task.favorit:
-            task.favorit = False
-            flash(f'Task: "{task.name}" has been unstarred!', 'success')
-        else:
-            task.favorit = True
-            flash(f'Task: "{task.name}" has been starred!', 'success')
-        db.session.commit()
-        return redirect(url_for('new_task', url_key=url_key))
-
-@app.route("/del/<url_key>/<id>", methods=["GET", "POST"])
-def del_task(url_key, id):
-    """Allow user to delete a task"""
-    with app.app_context():
-        task = db.session.query(Task).filter(Task.id == id).first()
-        db.session.delete(task)
-        db.session.commit()
-        flash(f'Task: "{task.name}" has been deleted!', 'success')
-        return redirect(url_for('new_task', url_key=url_key))
-
-@app.route("/copy/<url_key>", methods=["GET", "POST"])
-def copy_list(url_key):
-    """
-        Copy a exist To-do list along with all tasks under it;
-        list name format: name of exist list (copy)
-        Different points: 
-            - url_key
-            - list id, list name, create date
-            - task id
-    """
-    new_url_key = shortuuid.ShortUUID().random(length=10)
-    time = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
-    with app.app_context():
-        p_list = db.session.query(List).filter(List.url_key == url_key).first()
-        l_name = f"{p_list.name} (copy)"
-        n_list = List(name = l_name, url_key = new_url_key, created_date=time, task_cnt=p_list.task_cnt, archive=False, user_id=current_user.id)
-        db.session.add(n_list)
+                pending = 0
+        insert_tasks()
         db.session.commit()
-    with app.app_context():
-        p_list = db.session.query(List).filter(List.url_key == url_key).first()
-        all_tasks = db.session.query(Task).filter(Task.list_id == p_list.id).all()
-
-        n_list = db.session.query(List).filter(List.url_key == new_url_key).first()
-        for copy_task in all_tasks:
-            n_task = Task(
-                name = copy_task.name,
-                due_date = copy_task.due_date,
-                status = copy_task.status,
-                favorit = copy_task.favorit,
-                list_id = n_list.id,
-                )
-            db.session.add(n_task)
-            db.session.commit()
-        flash('✓ List copied successfully! Click the pencil mark to change list name.', "success")
-        return redirect(url_for("new_task", url_key=new_url_key))
+    except Exception:
+        db.session.rollback()
+        raise
+    logger.info("Imported %d list(s), %d task(s) for user %s", lists, tasks, user_id)
+    return lists, tasks
 
 # ============================================================================
 if __name__ == '__main__':
-    app.run()
+    # The app of the `main` module the blueprints import, not of this __main__ copy
+    import main
+    main.create_app().run()
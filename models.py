@@ -0,0 +1,140 @@
+"""
+    Database models of the To-do Manager.
+    `db` isn't bound to an app here: create_app() does it, and `flask init-db` creates the tables.
+"""
+from datetime import datetime
+from flask_login import UserMixin
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def column_value(value):
+    """Column value as it goes to JSON: datetimes are formatted with DATE_FORMAT"""
+    return value.strftime(DATE_FORMAT) if isinstance(value, datetime) else value
+
+
+class User(UserMixin, db.Model):
+    """ User Register Form """
+    __tablename__ = "users"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    email = db.Column(db.String(100), unique=True)
+    password = db.Column(db.String(255))
+    name = db.Column(db.String(1000))
+
+    addresses = db.relationship('List', backref='users', lazy=True)
+
+class UserPrincipal(UserMixin):
+    """
+        Lightweight copy of a User (id, email, name) kept by the user cache as current_user.
+        It's not bound to a session, so it can be shared between requests.
+    """
+    def __init__(self, id, email, name):
+        self.id = id
+        self.email = email
+        self.name = name
+
+    def __repr__(self):
+        return f"UserPrincipal: <{self.id}, {self.email}>"
+
+class List(db.Model):
+    """
+        To-do List TABLE Configuration. 
+
+        url_key: a key to link user and lists
+        ForiegnKey: user_id
+    """
+    __tablename__ = "lists"
+    __table_args__ = (
+        db.Index("ix_lists_user_archive", "user_id", "archive"),
+        db.Index("ix_lists_user_name", "user_id", "name"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    url_key = db.Column(db.String(250), nullable=False, unique=True)
+    name = db.Column(db.String(250), nullable=False, unique=False)
+    created_date = db.Column(db.DateTime, nullable=False, unique=False)
+    task_cnt = db.Column(db.Integer, nullable=False, unique=False, default=0)
+    done_cnt = db.Column(db.Integer, nullable=False, unique=False, default=0)
+    archive = db.Column(db.Boolean, nullable=False, default=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    
+    addresses = db.relationship('Task', backref='lists', lazy=True)
+    addresses = db.relationship('User', backref='lists', lazy=True)
+
+    def to_dict(self):
+        """
+            Package all items into a dict in order to more convinient usage afterward.
+            For loop and save all columns into a dict, return this dict
+        """
+        return {column.name: column_value(getattr(self, column.name)) for column in self.__table__.columns}
+
+    def __repr__(self):
+        """Preset the key info to be printed"""
+        return f"List: <{self.id}, {self.name}, {self.url_key}, {self.user_id}>"
+
+class Task(db.Model):
+    """
+        Task TABLE Configuration. 
+        ForiegnKey: list_id
+    """
+    __tablename__ = "tasks"
+    __table_args__ = (
+        db.Index("ix_tasks_list_order", "list_id", "status", "favorit", "due_date"),
+        db.Index("ix_tasks_due_date", "due_date"),
+        db.Index("ix_tasks_list_name", "list_id", "name"),
+        db.Index("ix_tasks_list_position", "list_id", "position"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(250), unique=False, nullable=False)
+    due_date = db.Column(db.DateTime, nullable=True)
+    status = db.Column(db.Boolean, nullable=False, default=False)
+    favorit = db.Column(db.Boolean, nullable=False, default=False)
+    list_id = db.Column(db.Integer, db.ForeignKey('lists.id'), nullable=False)
+    # Manual order in the list, sparse (see POSITION_GAP in main.py) so that a move updates one row
+    position = db.Column(db.BigInteger, nullable=False, default=0, server_default=db.text("0"))
+    # Bumped by every change of the task: a client sending back the version it saw detects concurrent changes
+    version = db.Column(db.Integer, nullable=False, default=1, server_default=db.text("1"))
+    # The due_date a reminder was sent for (see send_reminders); a task given a new due date is reminded again
+    reminded_due = db.Column(db.DateTime, nullable=True)
+
+    addresses = db.relationship('List', backref='tasks', lazy=True)
+
+    def to_dict(self):
+        """
+            Package all items into a dict in order to more convinient usage afterward.
+            For loop and save all columns into a dict, return this dict
+            (reminded_due is bookkeeping of the reminders, not a field of the task)
+        """
+        return {column.name: column_value(getattr(self, column.name))
+                for column in self.__table__.columns if column.name != "reminded_due"}
+
+    def __repr__(self):
+        """Preset the key info to be printed"""
+        return f"Card: <{self.id}, {self.name}, {self.due_date}, {self.status}, {self.favorit}, {self.list_id}>"
+
+class ListArchive(db.Model):
+    """
+        Cold storage of an archived list: its tasks, as zlib-compressed JSON, out of the tasks table.
+        The list row stays in lists (archive=True). See freeze_tasks() / thaw_tasks().
+    """
+    __tablename__ = "list_archives"
+
+    list_id = db.Column(db.Integer, db.ForeignKey('lists.id'), primary_key=True)
+    tasks = db.Column(db.LargeBinary(length=2 ** 24), nullable=False)
+    archived_date = db.Column(db.DateTime, nullable=False)
+
+class NameSuffix(db.Model):
+    """
+        Duplicate-name counters: how many times `name` has been given out in `scope`
+        (e.g. "list:12" for the tasks of a list, "user:3" for the lists of a user).
+        The rows of a list's scope are deleted with the list. See allocate_name().
+    """
+    __tablename__ = "name_suffixes"
+
+    scope = db.Column(db.String(50), primary_key=True)
+    name = db.Column(db.String(250), primary_key=True)
+    used = db.Column(db.Integer, nullable=False)
@@ -0,0 +1,118 @@
+"""
+    Due-date reminders: one digest email per user of the undone tasks due soon, see `flask send-reminders`
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from itertools import groupby
+from flask import current_app
+from sqlalchemy import or_
+from models import db, User, List, Task
+
+logger = logging.getLogger("todo")
+REMINDER_CLAIM_CHUNK = 500  # task ids per UPDATE ... WHERE id IN (...)
+
+def not_reminded():
+    """The task wasn't reminded for its current due date"""
+    return or_(Task.reminded_due.is_(None), Task.reminded_due != Task.due_date)
+
+def due_users(start, end):
+    """Ids of the users having tasks to remind, due in [start, end): a range on ix_tasks_due_date"""
+    return db.session.execute(
+        db.select(List.user_id).distinct()
+        .join(Task, Task.list_id == List.id)
+        .where(Task.due_date >= start, Task.due_date < end, Task.status == False, not_reminded())
+    ).scalars().all()
+
+def due_digests(user_ids, start, end):
+    """[(user row, [task rows])] of some users, their tasks ordered by due date"""
+    rows = db.session.execute(
+        db.select(List.user_id, Task.id, Task.name, Task.due_date, List.name.label("list_name"))
+        .join(List, Task.list_id == List.id)
+        .where(List.user_id.in_(user_ids), Task.due_date >= start, Task.due_date < end,
+               Task.status == False, not_reminded())
+        .order_by(List.user_id, Task.due_date, Task.id)
+    ).all()
+    # Rows, not User objects: they're read by the mailing threads after the session has committed
+    users = {user.id: user for user in db.session.execute(
+        db.select(User.id, User.email, User.name).where(User.id.in_(user_ids))
+    )}
+    return [(users[user_id], list(tasks)) for user_id, tasks in groupby(rows, key=lambda row: row.user_id)]
+
+def mark_reminded(task_ids, reminded):
+    """
+        Set (or clear) reminded_due on tasks still waiting for it; return the number of changed rows.
+        Two runs can't both claim a task: the second UPDATE finds it already reminded.
+    """
+    changed = 0
+    for i in range(0, len(task_ids), REMINDER_CLAIM_CHUNK):
+        query = db.update(Task).where(Task.id.in_(task_ids[i:i + REMINDER_CLAIM_CHUNK]))
+        if reminded:
+            query = query.where(not_reminded()).values(reminded_due=Task.due_date)
+        else:
+            query = query.values(reminded_due=None)
+        changed += db.session.execute(query.execution_options(synchronize_session=False)).rowcount
+    return changed
+
+def reminder_message(user, tasks):
+    """The digest email of a user"""
+    listed = current_app.config["REMINDER_DIGEST_SIZE"]
+    lines = [f"Hi {user.name},", "", "These tasks are due soon:", ""]
+    lines += [f"  {task.due_date:%Y-%m-%d %H:%M}  {task.name}  ({task.list_name})" for task in tasks[:listed]]
+    if len(tasks) > listed:
+        lines.append(f"  ... and {len(tasks) - listed} more")
+    message = EmailMessage()
+    message["From"] = current_app.config["OWN_EMAIL"]
+    message["To"] = user.email
+    message["Subject"] = f"{len(tasks)} task(s) due soon" if len(tasks) > 1 else f'"{tasks[0].name}" is due soon'
+    message.set_content("\n".join(lines))
+    return message
+
+def send_reminders(mailer, now=None):
+    """
+        One reminder run over the tasks due within REMINDER_WINDOW_HOURS; return (sent, failed) digests.
+        Users are taken REMINDER_BATCH_SIZE at a time: their tasks are claimed (reminded_due set) and committed
+        before mailing, the digests go out in parallel on the SMTP pool, and the claims of a digest that
+        couldn't be sent are cleared again for the next run. Each due date is reminded at most once,
+        even with several runs at the same time.
+    """
+    start = now or datetime.today()
+    end = start + timedelta(hours=current_app.config["REMINDER_WINDOW_HOURS"])
+    batch_size = current_app.config["REMINDER_BATCH_SIZE"]
+    user_ids = due_users(start, end)
+    sent = failed = 0
+
+    def deliver(digest):
+        user, message = digest
+        try:
+            mailer.send(message)
+            return True
+        except Exception:
+            logger.exception("Reminder to user %s not sent", user.id)
+            return False
+
+    with ThreadPoolExecutor(max_workers=current_app.config["MAIL_POOL_SIZE"], thread_name_prefix="reminder") as executor:
+        for i in range(0, len(user_ids), batch_size):
+            claimed = []
+            for user, tasks in due_digests(user_ids[i:i + batch_size], start, end):
+                task_ids = [task.id for task in tasks]
+                savepoint = db.session.begin_nested()
+                if mark_reminded(task_ids, True) == len(task_ids):
+                    savepoint.commit()
+                    claimed.append((user, tasks))
+                else:
+                    # Another run took some of these tasks: leave the user to it
+                    savepoint.rollback()
+            db.session.commit()
+            # Messages are built here: the mailing threads have no app context to read the settings from
+            messages = [(user, reminder_message(user, tasks)) for user, tasks in claimed]
+            for (user, tasks), delivered in zip(claimed, executor.map(deliver, messages)):
+                if delivered:
+                    sent += 1
+                else:
+                    mark_reminded([task.id for task in tasks], False)
+                    failed += 1
+            db.session.commit()
+    logger.info("Reminders: %d sent, %d failed, %d user(s) due", sent, failed, len(user_ids))
+    return sent, failed
@@ -0,0 +1,188 @@
+"""
+    Full-text search over task and list names, scoped to one user.
+
+    Backends, picked by setup() for the database in use (and found again by detect()):
+    - "mysql":  FULLTEXT indexes on tasks.name / lists.name, MATCH ... AGAINST in boolean mode
+    - "fts5":   SQLite FTS5 tables kept in sync with tasks / lists by triggers, ranked by bm25()
+    - "memory": InvertedIndex, an in-process index built per user from its rows (any other database)
+
+    Every query term must match; the last one also matches as a prefix, for search-as-you-type.
+"""
+import math
+import re
+from collections import defaultdict
+from sqlalchemy import inspect, text
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Tables whose name column is searchable
+TABLES = ("tasks", "lists")
+
+
+def tokenize(value):
+    """Lower-cased word tokens of a string"""
+    return TOKEN_RE.findall(value.lower())
+
+
+def fts5_query(terms):
+    """FTS5 MATCH expression: every term quoted (no FTS syntax gets through), the last one as prefix"""
+    quoted = ['"' + term.replace('"', '""') + '"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def mysql_query(terms):
+    """MySQL boolean-mode expression: every term required, the last one as prefix"""
+    return " ".join(f"+{term}" for term in terms[:-1]) + f" +{terms[-1]}*"
+
+
+# ============================================================================
+def fts5_available(conn):
+    return bool(conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+
+def setup_fts5(conn, table):
+    """Create the FTS5 table of `table` with its sync triggers; index the existing rows on creation"""
+    fts = f"{table}_fts"
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": fts}).first()
+    conn.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(name, content='{table}', content_rowid='id')"))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name);
+        END"""))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name);
+        END"""))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF name ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name);
+        END"""))
+    if not exists:
+        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def setup_mysql(conn, table):
+    """Add the FULLTEXT index of `table` when missing"""
+    if f"ft_{table}_name" not in {index["name"] for index in inspect(conn).get_indexes(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD FULLTEXT INDEX ft_{table}_name (name)"))
+
+
+def detect(conn):
+    """Backend of a database whose indexes were created by setup(): a cheap catalog lookup, no DDL"""
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        return "mysql"
+    if dialect == "sqlite" and conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks_fts'")
+    ).first():
+        return "fts5"
+    return "memory"
+
+
+def setup(conn, backend=None):
+    """Create the search indexes of the database behind `conn` and return the backend name"""
+    dialect = conn.dialect.name
+    if backend is None:
+        if dialect == "mysql":
+            backend = "mysql"
+        elif dialect == "sqlite" and fts5_available(conn):
+            backend = "fts5"
+        else:
+            backend = "memory"
+    for table in TABLES:
+        if backend == "mysql":
+            setup_mysql(conn, table)
+        elif backend == "fts5":
+            setup_fts5(conn, table)
+    return backend
+
+
+# ============================================================================
+TASK_COLUMNS = "tasks.id, tasks.name, tasks.status, lists.url_key AS list_url_key, lists.name AS list_name"
+LIST_COLUMNS = "lists.id, lists.name, lists.url_key, lists.archive"
+
+
+def search_sql(conn, backend, user_id, terms, kind, limit, offset):
+    """Ranked rows of `kind` ("tasks" or "lists") for a database backend, best match first"""
+    params = {"user_id": user_id, "limit": limit, "offset": offset}
+    if backend == "mysql":
+        params["query"] = mysql_query(terms)
+        match = f"MATCH({kind}.name) AGAINST (:query IN BOOLEAN MODE)"
+        score, where, join = match, match, ""
+    else:
+        params["query"] = fts5_query(terms)
+        # bm25() is lower for better matches
+        score, where = f"-bm25({kind}_fts)", f"{kind}_fts MATCH :query"
+        join = f"JOIN {kind} ON {kind}.id = {kind}_fts.rowid"
+    source = f"{kind}_fts {join}" if backend == "fts5" else kind
+    if kind == "tasks":
+        sql = f"""
+            SELECT {TASK_COLUMNS}, {score} AS score
+            FROM {source} JOIN lists ON lists.id = tasks.list_id
+            WHERE {where} AND lists.user_id = :user_id
+            ORDER BY score DESC, tasks.id LIMIT :limit OFFSET :offset"""
+    else:
+        sql = f"""
+            SELECT {LIST_COLUMNS}, {score} AS score
+            FROM {source}
+            WHERE {where} AND lists.user_id = :user_id
+            ORDER BY score DESC, lists.id LIMIT :limit OFFSET :offset"""
+    return [dict(row._mapping) for row in conn.execute(text(sql), params)]
+
+
+# ============================================================================
+class InvertedIndex:
+    """
+        In-process index of the task / list names of one user.
+        add() the rows once, then search() ranks them by tf-idf.
+    """
+    def __init__(self):
+        self.postings = defaultdict(dict)  # term -> {(kind, id): term frequency}
+        self.rows = {}  # (kind, id) -> row dict
+
+    def add(self, kind, row):
+        key = (kind, row["id"])
+        self.rows[key] = row
+        for term in tokenize(row["name"]):
+            self.postings[term][key] = self.postings[term].get(key, 0) + 1
+
+    def _matches(self, term, prefix):
+        """{doc: tf} of the docs containing `term` (or a term starting with it)"""
+        if not prefix:
+            return self.postings.get(term, {})
+        docs = {}
+        for candidate, postings in self.postings.items():
+            if candidate.startswith(term):
+                for key, tf in postings.items():
+                    docs[key] = docs.get(key, 0) + tf
+        return docs
+
+    def search(self, terms, kind, limit, offset):
+        total = len(self.rows) or 1
+        scores = None
+        for i, term in enumerate(terms):
+            docs = {key: tf for key, tf in self._matches(term, prefix=i == len(terms) - 1).items() if key[0] == kind}
+            idf = math.log(1 + total / (1 + len(docs)))
+            term_scores = {key: tf * idf for key, tf in docs.items()}
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {key: score + term_scores[key] for key, score in scores.items() if key in term_scores}
+        ranked = sorted((scores or {}).items(), key=lambda item: (-item[1], item[0][1]))
+        return [dict(self.rows[key], score=round(score, 4)) for key, score in ranked[offset:offset + limit]]
+
+
+def build_index(conn, user_id):
+    """InvertedIndex of all tasks and lists of a user, read with two streamed queries"""
+    index = InvertedIndex()
+    tasks = conn.execute(text(
+        f"SELECT {TASK_COLUMNS} FROM tasks JOIN lists ON lists.id = tasks.list_id WHERE lists.user_id = :user_id"
+    ).execution_options(stream_results=True), {"user_id": user_id})
+    for row in tasks:
+        index.add("tasks", dict(row._mapping))
+    lists = conn.execute(text(f"SELECT {LIST_COLUMNS} FROM lists WHERE lists.user_id = :user_id"), {"user_id": user_id})
+    for row in lists:
+        index.add("lists", dict(row._mapping))
+    return index
@@ -0,0 +1,135 @@
+"""
+    Task page of a list: add, rename, date, complete, star and delete tasks
+"""
+from datetime import datetime
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, abort, jsonify
+from flask_login import current_user
+from forms import TaskForm
+from main import (logger, render_sidebar, page_tasks, is_cold, allocate_name, adjust_counters, next_position,
+                  set_task_flag, TaskVersionConflict)
+from models import db, DATE_FORMAT, List, Task
+
+bp = Blueprint("tasks", __name__)
+
+
+@bp.route('/task/<url_key>', methods=["GET", "POST"])
+def new_task(url_key):
+    """Create a New Task without log-in"""
+    task_form = TaskForm()
+    t_name = request.form.get('name')
+    with current_app.app_context():
+        p_list = db.session.query(List).filter(List.url_key == url_key).first()
+        if is_cold(p_list):
+            flash(f'"{p_list.name}" is archived: unarchive it to see its tasks.', "error")
+            return redirect(url_for('lists.archived_lists'))
+        if task_form.validate_on_submit():
+            t_name = allocate_name(f"list:{p_list.id}", t_name, Task.name, Task.list_id == p_list.id)
+            n_task = Task(
+                name = t_name,
+                list_id = p_list.id,
+                position = next_position(p_list.id),
+                )
+            db.session.add(n_task)
+            adjust_counters(p_list.id, tasks=1)
+            db.session.commit()
+            logger.debug("New task created: %s", n_task)
+            flash("✓ Great, a new task created. you can add a due date or mark it as favorit.", "success")
+    
+        p_task, next_cursor = page_tasks(p_list.id)
+        return render_template('tasks.html', sidebar=render_sidebar(current_user.id, url_key), form=task_form, list=p_list, url_key=url_key, all_task=p_task, next_cursor=next_cursor)
+
+@bp.route('/task/<url_key>/more', methods=["GET"])
+def more_tasks(url_key):
+    """
+        Infinite scroll: return the next page of tasks after the `after` cursor,
+        as rendered task items along with the cursor of the following page.
+    """
+    with current_app.app_context():
+        p_list = db.session.query(List).filter(List.url_key == url_key).first()
+        if not p_list:
+            abort(404)
+        p_task, next_cursor = page_tasks(p_list.id, request.args.get('after'))
+        html = render_template('_task_items.html', form=TaskForm(), list=p_list, all_task=p_task)
+        return jsonify(html=html, next=next_cursor)
+
+@bp.route("/edit_task_name/<url_key>/<id>", methods=["GET", "POST"])
+def edit_t_name(url_key, id):
+    """Allow user to change task name"""
+    with current_app.app_context():
+        task = db.session.query(Task).filter(Task.id == id).first()
+        task.name = request.form['new-t-name']
+        db.session.commit()
+        flash("✓ Task's name has been updated!", "success")
+        logger.debug("Task %s renamed to: %s", task.id, task.name)
+        return redirect(url_for("tasks.new_task", url_key=url_key))
+
+@bp.route("/date/<url_key>/<id>", methods=["GET", "POST"])
+def new_date(url_key, id):
+    """Allow user to add task due date"""
+    with current_app.app_context():
+        task = db.session.query(Task).filter(Task.id == id).first()
+        try:
+            task.due_date = datetime.strptime(request.form.get('due_date', ''), DATE_FORMAT)
+        except ValueError:
+            flash(f'❗️ The due date must be formatted as {DATE_FORMAT}, please try again.', 'error')
+            return redirect(url_for('tasks.new_task', url_key=url_key))
+        db.session.commit()
+        flash(f'✓ Due date of task: "{task.name}" has been added!', 'success')
+        return redirect(url_for('tasks.new_task', url_key=url_key))
+
+@bp.route("/complete/<url_key>/<int:id>", methods=["POST"])
+def complete(url_key, id):
+    """
+        Allow user to change status of task: completed when its checkbox is checked.
+        The checkbox state is the target, so a double submit changes nothing (see set_task_flag).
+    """
+    return set_flag(url_key, id, "status", bool(request.form.get("status")))
+
+@bp.route("/favorit/<url_key>/<int:id>", methods=["POST"])
+def check_favorit(url_key, id):
+    """Allow user to star a task ("favorit": "true") or unstar it ("false")"""
+    return set_flag(url_key, id, "favorit", request.form.get("favorit") == "true")
+
+def set_flag(url_key, id, field, value):
+    """
+        Set the status / favorit of a task from one of its forms, which send the version the page was rendered with:
+        when the task has changed since (another tab), nothing is changed and the current state is shown.
+    """
+    with current_app.app_context():
+        p_list = db.session.query(List).filter(List.url_key == url_key).first()
+        if not p_list:
+            abort(404)
+        try:
+            changed = set_task_flag(id, p_list.id, field, value, request.form.get("version", type=int))
+        except TaskVersionConflict:
+            db.session.rollback()
+            flash("❗️ This task was changed in another window, here is its current state.", "error")
+            return redirect(url_for('tasks.new_task', url_key=url_key))
+        if changed is None:
+            abort(404)
+        db.session.commit()
+        if changed:
+            row = db.session.execute(
+                db.select(Task.name, List.task_cnt, List.done_cnt).join(List, Task.list_id == List.id).where(Task.id == id)
+            ).first()
+            if field == "favorit":
+                flash(f'Task: "{row.name}" has been {"starred" if value else "unstarred"}!', 'success')
+            elif value:
+                flash(f'Status of task: "{row.name}" has been changed to completed!', 'success')
+                logger.debug("List %s: %s/%s tasks finished", p_list.id, row.done_cnt, row.task_cnt)
+                if row.task_cnt == row.done_cnt:
+                    flash('All tasks finished! Good job!', 'success')
+            else:
+                flash(f'Status of task: "{row.name}" has been changed!', 'success')
+    return redirect(url_for('tasks.new_task', url_key=url_key))
+
+@bp.route("/del/<url_key>/<id>", methods=["GET", "POST"])
+def del_task(url_key, id):
+    """Allow user to delete a task"""
+    with current_app.app_context():
+        task = db.session.query(Task).filter(Task.id == id).first()
+        db.session.delete(task)
+        adjust_counters(task.list_id, tasks=-1, done=-1 if task.status else 0)
+        db.session.commit()
+        flash(f'Task: "{task.name}" has been deleted!', 'success')
+        return redirect(url_for('tasks.new_task', url_key=url_key))
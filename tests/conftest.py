@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from main import create_app, init_db
+from models import db, User
+
+
+class TestConfig(config.Config):
+    """Settings of the test app: a SQLite file per test, no CSRF, fast password hashes"""
+    TESTING = True
+    SECRET_KEY = "test"
+    WTF_CSRF_ENABLED = False
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+    SEARCH_BACKEND = "memory"
+
+
+@pytest.fixture
+def app(tmp_path):
+    TestConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'todo.db'}"
+    app = create_app(TestConfig)
+    with app.app_context():
+        init_db()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def users(app):
+    """Ids of two users"""
+    with app.app_context():
+        rows = [User(email=f"user{n}@example.com", name=f"user{n}", password="-") for n in (1, 2)]
+        db.session.add_all(rows)
+        db.session.commit()
+        return [row.id for row in rows]
+
+
+@pytest.fixture
+def statements(app):
+    """SQL statements run on the app's engine, appended as they're sent"""
+    sent = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: sent.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    yield sent
+    event.remove(engine, "before_cursor_execute", listener)
@@ -0,0 +1,20 @@
+import pytest
+from flask import request
+from sqlalchemy.exc import IntegrityError
+
+from instrumentation import ENVIRON_KEY, RequestStats
+from models import db, User
+
+
+def test_failed_statement_leaves_nothing_behind(app):
+    with app.test_request_context():
+        request.environ[ENVIRON_KEY] = stats = RequestStats()
+        db.session.add_all([User(email="same@example.com"), User(email="same@example.com")])
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+        connection = db.session.connection()
+        assert not any(key.startswith("metrics") for key in connection.info)
+        connection.execute(db.text("SELECT 1"))
+        assert stats.queries >= 1
+        assert all(elapsed >= 0 for elapsed, _ in stats.statements)
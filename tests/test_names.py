@@ -0,0 +1,128 @@
+import threading
+from datetime import datetime
+
+from main import allocate_name, delete_list
+from models import db, List, Task, NameSuffix
+
+
+def new_list(user_id, name):
+    """Name a new list of `user_id` like the new-list view does"""
+    n_list = List(
+        user_id=user_id, url_key=f"{user_id}-{db.session.query(List).count()}", created_date=datetime.now(),
+        name=allocate_name(f"user:{user_id}", name, List.name, List.user_id == user_id),
+    )
+    db.session.add(n_list)
+    db.session.commit()
+    return n_list
+
+
+def new_task(list_id, name):
+    """Name a new task of `list_id` like the new-task view does"""
+    n_task = Task(list_id=list_id, name=allocate_name(f"list:{list_id}", name, Task.name, Task.list_id == list_id))
+    db.session.add(n_task)
+    db.session.commit()
+    return n_task
+
+
+def test_repeated_names_get_suffixes(app, users):
+    with app.app_context():
+        todo = new_list(users[0], "todo")
+        assert [new_task(todo.id, "foo").name for _ in range(4)] == ["foo", "foo(1)", "foo(2)", "foo(3)"]
+
+
+def test_two_statements_per_allocation(app, users, statements):
+    with app.app_context():
+        list_id = new_list(users[0], "todo").id
+        for _ in range(3):
+            new_task(list_id, "foo")
+            del statements[:]
+            allocate_name(f"list:{list_id}", "foo", Task.name, Task.list_id == list_id)
+            assert len(statements) == 2
+            db.session.rollback()
+
+
+def test_task_names_are_scoped_per_list(app, users):
+    with app.app_context():
+        todo, done = new_list(users[0], "todo"), new_list(users[0], "done")
+        assert new_task(todo.id, "foo").name == "foo"
+        assert new_task(done.id, "foo").name == "foo"
+        assert new_task(todo.id, "foo").name == "foo(1)"
+        assert new_task(done.id, "foo").name == "foo(1)"
+
+
+def test_list_names_are_scoped_per_user(app, users):
+    with app.app_context():
+        assert new_list(users[0], "todo").name == "todo"
+        assert new_list(users[1], "todo").name == "todo"
+        assert new_list(users[0], "todo").name == "todo(1)"
+
+
+def test_free_name_is_given_out_again(app, users):
+    with app.app_context():
+        todo = new_list(users[0], "todo")
+        foo = new_task(todo.id, "foo")
+        db.session.delete(foo)
+        db.session.commit()
+        assert new_task(todo.id, "foo").name == "foo"
+        assert new_task(todo.id, "foo").name == "foo(1)"
+
+
+def test_counter_is_seeded_from_existing_rows(app, users):
+    with app.app_context():
+        todo = new_list(users[0], "todo")
+        db.session.add_all([Task(list_id=todo.id, name="foo"), Task(list_id=todo.id, name="foo(1)")])
+        db.session.commit()
+        assert new_task(todo.id, "foo").name == "foo(2)"
+        assert new_task(todo.id, "foo").name == "foo(3)"
+
+
+def test_delete_list_drops_its_counters(app, users):
+    with app.app_context():
+        todo, done = new_list(users[0], "todo"), new_list(users[0], "done")
+        new_task(todo.id, "foo")
+        new_task(done.id, "foo")
+        delete_list(todo)
+        db.session.commit()
+        assert {scope for scope, in db.session.query(NameSuffix.scope)} == {f"user:{users[0]}", f"list:{done.id}"}
+
+
+def test_counter_skips_gapped_suffixes(app, users):
+    with app.app_context():
+        list_id = new_list(users[0], "todo").id
+        db.session.add_all([Task(list_id=list_id, name="foo"), Task(list_id=list_id, name="foo(2)")])
+        db.session.commit()
+        assert [new_task(list_id, "foo").name for _ in range(2)] == ["foo(3)", "foo(4)"]
+
+
+def test_counter_skips_suffix_taken_by_rename(app, users):
+    with app.app_context():
+        list_id = new_list(users[0], "todo").id
+        assert [new_task(list_id, "foo").name for _ in range(2)] == ["foo", "foo(1)"]
+        db.session.add_all([Task(list_id=list_id, name="foo(2)"), Task(list_id=list_id, name="foo(4)")])
+        db.session.commit()
+        assert [new_task(list_id, "foo").name for _ in range(2)] == ["foo(5)", "foo(6)"]
+
+
+def test_concurrent_allocations_are_distinct(app, users):
+    with app.app_context():
+        list_id = new_list(users[0], "todo").id
+        db.session.add_all([Task(list_id=list_id, name=name) for name in ("foo", "foo(1)", "foo(3)", "foo(7)")])
+        db.session.commit()
+    workers, rounds = 8, 5
+    barrier = threading.Barrier(workers)
+
+    def worker():
+        barrier.wait()
+        for _ in range(rounds):
+            with app.app_context():
+                new_task(list_id, "foo")
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with app.app_context():
+        names = [name for name, in db.session.query(Task.name).filter(Task.list_id == list_id)]
+    assert len(names) == 4 + workers * rounds
+    assert len(set(names)) == len(names)
@@ -0,0 +1,100 @@
+import threading
+from datetime import datetime
+from collections import Counter
+
+import pytest
+
+from models import db, List, Task
+
+EMAIL, PASSWORD = "owner@example.com", "pw123456"
+
+
+@pytest.fixture
+def owner(app):
+    """A logged-in client and the url_key of its new list of 20 tasks"""
+    client = app.test_client()
+    client.post("/register", data={"email": EMAIL, "password": PASSWORD, "name": "owner"})
+    url_key = client.get("/new_list").location.rsplit("/", 1)[1]
+    for n in range(20):
+        client.post(f"/task/{url_key}", data={"name": f"task {n}"})
+    return client, url_key
+
+
+def list_counters(app, url_key):
+    with app.app_context():
+        p_list = db.session.query(List).filter(List.url_key == url_key).one()
+        return p_list.task_cnt, p_list.done_cnt
+
+
+def test_api_create_task_counts_done(app, owner):
+    client, url_key = owner
+    response = client.post(f"/api/v1/lists/{url_key}/tasks", json={"name": "done already", "status": True})
+    assert response.status_code == 201
+    assert list_counters(app, url_key) == (21, 1)
+
+
+def test_api_set_status_requires_status(app, owner):
+    client, url_key = owner
+    response = client.post(f"/api/v1/lists/{url_key}/tasks/status", json={"ids": [1, 2]})
+    assert response.status_code == 400
+    response = client.post(f"/api/v1/lists/{url_key}/tasks/status", json={"ids": [1, 2], "status": True})
+    assert [task["id"] for task in response.get_json()["tasks"]] == [1, 2]
+    response = client.post(f"/api/v1/lists/{url_key}/tasks/status", json={"ids": [1, 2], "status": True})
+    assert response.get_json()["tasks"] == []
+    assert list_counters(app, url_key) == (20, 2)
+
+
+def test_concurrent_complete_and_star(app, owner):
+    """Many tabs complete (from version 1, what they all saw) and star every task at once: each change counts once"""
+    _, url_key = owner
+    clients, responses = 16, Counter()
+    barrier = threading.Barrier(clients)
+
+    def tab():
+        client = app.test_client()
+        client.post("/login", data={"email": EMAIL, "password": PASSWORD})
+        barrier.wait()
+        for task_id in range(1, 21):
+            responses[client.post(f"/complete/{url_key}/{task_id}", data={"status": "on", "version": 1}).status_code] += 1
+            responses[client.post(f"/favorit/{url_key}/{task_id}", data={"favorit": "true"}).status_code] += 1
+
+    threads = [threading.Thread(target=tab) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(responses) == {302}
+    assert list_counters(app, url_key) == (20, 20)
+    with app.app_context():
+        rows = db.session.query(Task.status, Task.favorit, Task.version).all()
+    assert len(rows) == 20
+    assert all(row.status and row.favorit and row.version == 3 for row in rows)
+
+
+def test_api_update_moves_version_once(app, owner):
+    client, _ = owner
+    response = client.patch("/api/v1/tasks/1", json={
+        "version": 1, "name": "renamed", "due_date": None, "status": True, "favorit": True,
+    })
+    assert response.status_code == 200
+    task = response.get_json()["task"]
+    assert (task["name"], task["status"], task["favorit"], task["version"]) == ("renamed", True, True, 2)
+    assert client.patch("/api/v1/tasks/1", json={"version": 1, "name": "again"}).status_code == 409
+    # A retry changes nothing
+    assert client.patch("/api/v1/tasks/1", json={"status": True, "favorit": True}).get_json()["task"]["version"] == 2
+    assert client.patch("/api/v1/tasks/1", json={"version": 2, "name": "again"}).get_json()["task"]["version"] == 3
+    with app.app_context():
+        assert db.session.get(Task, 1).version == 3
+
+
+def test_orm_change_moves_version_once(app, owner):
+    with app.app_context():
+        task = db.session.get(Task, 1)
+        task.name = task.name
+        task.reminded_due = datetime.now()
+        db.session.commit()
+        assert task.version == 1
+        task.name, task.favorit = "renamed", True
+        db.session.commit()
+        assert task.version == 2
@@ -0,0 +1,109 @@
+"""
+    Streaming formats of the list / task export and import.
+
+    Records are ("list", row) and ("task", row) pairs; a task belongs to the list before it.
+    Rows hold strings, booleans and None only (dates are already formatted).
+    - "json": JSON Lines, one {"type": "list" | "task", ...} object per line
+    - "csv":  one line per task, prefixed by the columns of its list; a list without tasks
+              is a line with empty task columns
+    Both are written and read one record at a time, so memory doesn't grow with the account size.
+"""
+import csv
+import io
+import json
+
+LIST_FIELDS = ("name", "created_date", "archive")
+TASK_FIELDS = ("name", "due_date", "status", "favorit")
+CSV_HEADER = ["list"] + [f"list_{field}" for field in LIST_FIELDS] + [f"task_{field}" for field in TASK_FIELDS]
+
+MIMETYPES = {"json": "application/x-ndjson", "csv": "text/csv"}
+EXTENSIONS = {"json": "jsonl", "csv": "csv"}
+
+
+class ImportFormatError(ValueError):
+    """Raised when an import file can't be read"""
+
+
+def write_json(records):
+    for kind, row in records:
+        yield json.dumps({"type": kind, **row}, ensure_ascii=False) + "\n"
+
+
+def write_csv(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(values)
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    yield line(CSV_HEADER)
+    list_number, list_values, list_written = 0, None, True
+    for kind, row in records:
+        if kind == "list":
+            if not list_written:
+                yield line(list_values + [""] * len(TASK_FIELDS))
+            list_number += 1
+            list_values = [list_number] + [row[field] for field in LIST_FIELDS]
+            list_written = False
+        else:
+            yield line(list_values + [row[field] for field in TASK_FIELDS])
+            list_written = True
+    if not list_written:
+        yield line(list_values + [""] * len(TASK_FIELDS))
+
+
+def read_json(lines):
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            kind = record.pop("type")
+        except (ValueError, KeyError, AttributeError):
+            raise ImportFormatError(f"Line {number}: not a list or task record")
+        fields = LIST_FIELDS if kind == "list" else TASK_FIELDS if kind == "task" else None
+        if fields is None:
+            raise ImportFormatError(f'Line {number}: unknown record type "{kind}"')
+        yield kind, {field: record.get(field) for field in fields}
+
+
+def csv_bool(value):
+    return (value or "").strip().lower() in ("true", "1", "yes")
+
+
+def csv_rows(reader):
+    """Rows of a csv.DictReader, with its parse errors raised as ImportFormatError"""
+    try:
+        yield from reader
+    except csv.Error as error:
+        raise ImportFormatError(f"Line {reader.line_num}: {error}")
+
+
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    if reader.fieldnames != CSV_HEADER:
+        raise ImportFormatError(f"The CSV header must be: {','.join(CSV_HEADER)}")
+    current = None
+    for row in csv_rows(reader):
+        if row["list"] != current:
+            current = row["list"]
+            yield "list", {
+                "name": row["list_name"],
+                "created_date": row["list_created_date"] or None,
+                "archive": csv_bool(row["list_archive"]),
+            }
+        if row["task_name"]:
+            yield "task", {
+                "name": row["task_name"],
+                "due_date": row["task_due_date"] or None,
+                "status": csv_bool(row["task_status"]),
+                "favorit": csv_bool(row["task_favorit"]),
+            }
+
+
+WRITERS = {"json": write_json, "csv": write_csv}
+READERS = {"json": read_json, "csv": read_csv}
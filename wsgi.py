@@ -0,0 +1,7 @@
+"""
+    WSGI entry point of the production server:
+        gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from main import create_app
+
+app = create_app()